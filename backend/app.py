@@ -1,26 +1,60 @@
-from flask import Flask, request, jsonify
+from dotenv import load_dotenv
+# Load .env before anything reads its settings
+load_dotenv()
+
+from flask import Blueprint, Flask, current_app, has_request_context, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate, upgrade
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from werkzeug.security import generate_password_hash, check_password_hash
 from extensions import db
 from models import User, Challenge, UserChallengeProgress, CommunityChat, Goal, FavoriteChallenge
-from dotenv import load_dotenv
+from token_cache import TokenCache
+from pagination import parse_limit, parse_non_negative, parse_fields, decode_cursor, keyset_page
+import leaderboard
+import chat_feed
+import chat_archive
+import exports
+import profiling
+import query_plans
+import auth
+import badges
+import batch
+import search
+from challenge_stats import challenge_list_query, challenge_query, rebuild_stats
+from progress import calendar, challenge_progress, check_in, check_in_many, completed_ids
+from response_cache import ResponseCache
+from etags import conditional, versions
+from compression import Compression, compression
+from db_routing import LAST_WRITE_HEADER, ReplicaRouter, read_primary
+import identity
+from identity import current_user_id, remember_user_id
+from serializers import (
+    CHALLENGE_FIELDS, CHALLENGE_LIST_FIELDS, CHALLENGE_DETAIL_FIELDS, STATS_FIELDS, USER_STATE_FIELDS, USER_FIELDS, GOAL_FIELDS,
+    FastJSONProvider,
+    columns, row_serializer, serialize_user, serialize_message, serialize_goal
+)
+from config import Config, engine_options, pool_stats, replica_binds
 from datetime import datetime
 import os
+import click
 # Firebase Token Verification Decorator
 from functools import wraps
 
-# Firebase Admin Setup
-import firebase_admin
-from firebase_admin import credentials, auth as firebase_auth
-
-cred = credentials.Certificate("firebase_admin_config.json")
-firebase_admin.initialize_app(cred)
+# Decoded tokens are reused until their own expiry to skip repeat verification
+token_cache = TokenCache()
 
 
 def firebase_token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
+        # Sub-requests of /batch reuse the token verified by the batch itself
+        if g.get('verified_user') is not None:
+            request.user = g.verified_user
+            return f(*args, **kwargs)
+
         token = None
         if 'Authorization' in request.headers:
             parts = request.headers['Authorization'].split(" ")
@@ -31,7 +65,8 @@ def firebase_token_required(f):
             return jsonify({'message': 'Token is missing!'}), 401
 
         try:
-            decoded_token = firebase_auth.verify_id_token(token)
+            with profiling.phase('auth'):
+                decoded_token = token_cache.verify(token, current_app.extensions['auth'].verify_id_token)
             request.user = decoded_token  # You can access request.user['uid']
         except Exception as e:
             return jsonify({'message': 'Invalid or expired token', 'error': str(e)}), 401
@@ -40,22 +75,97 @@ def firebase_token_required(f):
     return decorated
 
 
-app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "*"}})
-load_dotenv()
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL")
-app.config['SECRET_KEY'] = 'your-secret-key'
+# Routes and CLI commands; create_app() registers them on an app
+api = Blueprint('api', __name__, cli_group=None)
+
+profiler = profiling.Profiler()
+# gzip/brotli for JSON, MessagePack and export bodies (see compression.py)
+compressor = Compression()
+# Schema changes are managed with Alembic: flask --app app db upgrade
+migrate = Migrate(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'),
+                  render_as_batch=True)
+
+MAX_BULK_PROGRESS = 500
+
+# Wakes long-poll and SSE readers of the community chat
+chat_broker = chat_feed.LocalChatBroker()
+chat_waiters = chat_feed.WaiterSlots()
+
+# Read-mostly responses, keyed on the resource_versions counters their writes bump
+response_cache = ResponseCache(versions)
+
+# Recomputes badge counters after completions, outside the request
+badge_worker = badges.BadgeWorker()
+
+# Sends GET reads to DATABASE_REPLICA_URL when it is set
+replica_router = ReplicaRouter()
+
+
+def metrics_token_required(f):
+    # Operational endpoints; closed without METRICS_TOKEN unless METRICS_PUBLIC opts in
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        expected = current_app.config['METRICS_TOKEN']
+        if expected:
+            allowed = request.headers.get('X-Metrics-Token') == expected
+        else:
+            allowed = current_app.config['METRICS_PUBLIC']
+        if not allowed:
+            return jsonify({'message': 'Forbidden'}), 403
+        return f(*args, **kwargs)
+    return decorated
 
-db.init_app(app)
 
+def admin_token_required(f):
+    # A missing ADMIN_TOKEN keeps the route closed; there is no public opt-in
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        expected = current_app.config['ADMIN_TOKEN']
+        if not expected or request.headers.get('X-Admin-Token') != expected:
+            return jsonify({'message': 'Forbidden'}), 403
+        return f(*args, **kwargs)
+    return decorated
 
-@app.route('/')
+
+@api.route('/')
 def home():
     return "Fitness Challenge App backend"
 
 
+# Run several GET requests in one round-trip, e.g. on app start-up:
+# {"requests": ["/latest", "/account", {"path": "/goals", "headers": {"If-None-Match": "..."}}]}
+@api.route('/batch', methods=['POST'])
+@firebase_token_required
+def run_batch():
+    try:
+        entries = batch.validate_entries(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    return jsonify({'responses': batch.run_batch(entries, request.user)}), 200
+
+
+# Connection pool usage for this worker process
+@api.route('/metrics/pool', methods=['GET'])
+@metrics_token_required
+def get_pool_stats():
+    stats = pool_stats(db.engine)
+    if 'replica' in db.engines:
+        stats['replica'] = dict(pool_stats(db.engines['replica']), **replica_router.stats())
+    return jsonify(stats), 200
+
+
+# Per-route latency and SQL metrics in Prometheus text format (PROFILING=1)
+@api.route('/metrics', methods=['GET'])
+@metrics_token_required
+def get_metrics():
+    if not profiler.enabled:
+        return jsonify({'message': 'Profiling is disabled'}), 404
+    return Response(profiler.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 # Create a Fitness Challenge
-@app.route('/challenges', methods=['POST'])
+@api.route('/challenges', methods=['POST'])
 @firebase_token_required
 def create_challenge():
     data = request.get_json()
@@ -83,60 +193,122 @@ def create_challenge():
         return jsonify({'error': 'Invalid input', 'details': str(e)}), 400
 
 
+def wants_user_state():
+    return request.args.get('include') == 'user_state'
+
+
+def challenge_list_versions(*names):
+    """Version marker of a challenge list; per-user lists add the caller's state."""
+    names = ('challenges', 'challenge_stats') + names
+    if wants_user_state():
+        names += ('favorites:%s' % current_user_id(), 'progress:' + request.user['uid'])
+    return versions(*names)
+
+
+def challenge_list_response(default_fields, *criteria):
+    """Shared body of the challenge list routes.
+
+    Supports ?fields= to project columns in SQL and ?limit= / ?cursor= for
+    keyset pagination on (created_at, id). Without either paging parameter
+    the full list is returned as before. Completion stats are included
+    unless ?fields= leaves them out. ?include=user_state adds the caller's
+    is_favorite, is_completed and current_day, joined in the same query.
+    """
+    try:
+        fields = parse_fields(request.args.get('fields'), CHALLENGE_FIELDS + STATS_FIELDS) or default_fields + STATS_FIELDS
+        limit = parse_limit(request.args.get('limit'))
+        cursor = decode_cursor(request.args.get('cursor'))
+        if request.args.get('include', 'user_state') != 'user_state':
+            raise ValueError('include must be user_state')
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    paginate = 'limit' in request.args or 'cursor' in request.args
+
+    uid = user_id = None
+    if wants_user_state():
+        fields = tuple(fields) + USER_STATE_FIELDS
+        uid, user_id = request.user['uid'], current_user_id()
+
+    query = challenge_list_query(fields, *criteria, uid=uid, user_id=user_id)
+
+    next_cursor = None
+    if paginate:
+        rows, next_cursor = keyset_page(query, Challenge.created_at, Challenge.id, cursor, limit)
+    else:
+        rows = query.all()
+
+    serialize = row_serializer(fields)
+    with profiling.phase('serialize'):
+        payload = {'challenges': [serialize(row) for row in rows]}
+    if paginate:
+        payload['next_cursor'] = next_cursor
+    return jsonify(payload), 200
+
+
+serialize_challenge_detail = row_serializer(CHALLENGE_DETAIL_FIELDS)
+
+
 # Route to retrieve all challenges from the database
-@app.route('/challenges', methods=['GET'])
+# ?include=user_state marks the caller's favorites and progress in the same response
+@api.route('/challenges', methods=['GET'])
 @firebase_token_required
+@conditional(challenge_list_versions)
 def get_challenges():
-    # Get the authenticated user's UID from the decoded Firebase token
-    user_id = request.user['uid']
-    print("Authenticated Firebase UID:", user_id)
+    return challenge_list_response(CHALLENGE_LIST_FIELDS)
 
-    # Fetch all challenges from the database
-    challenges = Challenge.query.all()
-    output = []
 
-    for c in challenges:
-        challenge_data = {
-            'id': c.id,
-            'title': c.title,
-            'description': c.description,
-            'goal': c.goal,
-            'unit': c.unit,
-            'difficulty': c.difficulty,
-            'start_date': c.start_date.isoformat() if c.start_date else None,
-            'end_date': c.end_date.isoformat() if c.end_date else None,
-            'created_at': c.created_at.isoformat() if c.created_at else None,
-            'creator': c.creator
-        }
-        output.append(challenge_data)
+# Ranked search over title, description and goal_list
+# ?q= is required; ?difficulty=, ?unit=, ?start_after= and ?end_before= narrow
+# the matches and ?limit= / ?offset= page through them
+@api.route('/challenges/search', methods=['GET'])
+@firebase_token_required
+@conditional(lambda: versions('challenges', 'challenge_stats'))
+def search_challenges():
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify({'message': 'q is required'}), 400
+    try:
+        fields = parse_fields(request.args.get('fields'), CHALLENGE_FIELDS + STATS_FIELDS) or CHALLENGE_LIST_FIELDS + STATS_FIELDS
+        limit = parse_limit(request.args.get('limit'))
+        offset = request.args.get('offset', 0, type=int)
+        if offset < 0:
+            raise ValueError('offset must be a non-negative integer')
+        start_after = search.parse_date(request.args.get('start_after'), 'start_after')
+        end_before = search.parse_date(request.args.get('end_before'), 'end_before')
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    # id is always selected since rows are matched back to the ranking by it
+    selected = list(fields) + (['id'] if 'id' not in fields else [])
+    rows = search.search_challenges(
+        q, challenge_query(selected), limit, offset,
+        difficulty=request.args.get('difficulty'),
+        unit=request.args.get('unit'),
+        start_after=start_after,
+        end_before=end_before,
+    )
 
-    return jsonify({'challenges': output}), 200
+    serialize = row_serializer(fields)
+    return jsonify({
+        'challenges': [serialize(row) for row in rows],
+        'next_offset': offset + limit if len(rows) == limit else None,
+    }), 200
 
 
 # Route to fetch the details of a specific challenge by its ID
-@app.route('/challenges/<int:challenge_id>', methods=['GET'])
+@api.route('/challenges/<int:challenge_id>', methods=['GET'])
 @firebase_token_required
+@read_primary
+@response_cache.cached('challenges', 'challenge_stats')
 def get_challenge_by_id(challenge_id):
-    challenge = Challenge.query.get_or_404(challenge_id)
+    challenge = challenge_query(CHALLENGE_DETAIL_FIELDS).filter(Challenge.id == challenge_id).first_or_404()
 
     # Return the challenge details as JSON.
-    return jsonify({
-        'id': challenge.id,
-        'title': challenge.title,
-        'description': challenge.description,
-        'goal': challenge.goal,
-        'unit': challenge.unit,
-        'difficulty': challenge.difficulty,
-        'start_date': challenge.start_date.isoformat() if challenge.start_date else None,
-        'end_date': challenge.end_date.isoformat() if challenge.end_date else None,
-        'created_at': challenge.created_at.isoformat() if challenge.created_at else None,
-        'creator': challenge.creator,
-        'goal_list': challenge.goal_list or []
-    }), 200
+    return jsonify(serialize_challenge_detail(challenge)), 200
 
 
 # Route to delete a specific challenge by its ID
-@app.route('/challenges/<int:challenge_id>', methods=['DELETE'])
+@api.route('/challenges/<int:challenge_id>', methods=['DELETE'])
 @firebase_token_required
 def delete_challenge(challenge_id):
     # Attempt to find the challenge by ID, or return 404 if not found
@@ -155,135 +327,133 @@ def delete_challenge(challenge_id):
         return jsonify({'message': 'Failed to delete challenge', 'error': str(e)}), 500
 
 
-@app.route('/progress/<int:challenge_id>', methods=['POST'])
+# Check in on a challenge for today, or for {"date": "YYYY-MM-DD"} (the client's local date)
+@api.route('/progress/<int:challenge_id>', methods=['POST'])
 @firebase_token_required
 def update_progress(challenge_id):
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    if not isinstance(data, dict) or not isinstance(data.get('date', ''), (str, type(None))):
+        return jsonify({'message': 'Body must be an object with an optional "date": "YYYY-MM-DD"'}), 400
     try:
-        user_id = request.user['uid']
+        day = search.parse_date(data.get('date'), 'date') or datetime.utcnow().date()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
 
-        progress = UserChallengeProgress.query.filter_by(
-            user_id=user_id,
-            challenge_id=challenge_id
-        ).first()
-
-        if not progress:
-            progress = UserChallengeProgress(
-                user_id=user_id,
-                challenge_id=challenge_id,
-                current_day=7,
-                completed=True
-            )
-        else:
-            if progress.completed:
-                return jsonify({'message': 'Challenge already completed'}), 200
+    challenge = db.session.get(Challenge, challenge_id)
+    if not challenge:
+        return jsonify({'message': 'Challenge not found'}), 404
 
-            # progress.current_day += 1
-            # if progress.current_day >= 7:
-            progress.current_day = 7
-            progress.completed = True
+    try:
+        user_id = request.user['uid']
 
-        db.session.add(progress)
+        # Locks the progress row, so double taps and concurrent first check-ins count once
+        state, completed = check_in(user_id, challenge, day)
         db.session.commit()
+        if completed:
+            badge_worker.submit(user_id)
 
-        return jsonify({
-            'message': 'Progress updated',
-            'current_day': progress.current_day,
-            'completed': progress.completed
-        }), 200
+        return jsonify(dict(state, message='Progress updated')), 200
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
+        db.session.rollback()
         print("Error in /progress route:", str(e))
         return jsonify({'error': 'Something went wrong', 'details': str(e)}), 500
 
-@app.route('/progress/<int:challenge_id>', methods=['GET'])
+
+# Sync dated check-ins made offline: {"check_ins": [{"challenge_id": 1, "date": "YYYY-MM-DD"}, ...]}
+# Entries follow the rules of POST /progress/<id>; the ones it refuses are listed under "rejected"
+@api.route('/progress', methods=['POST'])
 @firebase_token_required
-def get_progress(challenge_id):
-    user_id = request.user['uid']
-    progress = UserChallengeProgress.query.filter_by(
-        user_id=user_id,
-        challenge_id=challenge_id
-    ).first()
+def update_progress_bulk():
+    data = request.get_json(silent=True)
+    items = data.get('check_ins') if isinstance(data, dict) else None
+    message = 'check_ins must be a list of {"challenge_id": <int>, "date": "YYYY-MM-DD"} objects'
+    if not isinstance(items, list) or not all(
+        isinstance(item, dict) and type(item.get('challenge_id')) is int and isinstance(item.get('date'), str)
+        for item in items
+    ):
+        return jsonify({'message': message}), 400
+    if len(items) > MAX_BULK_PROGRESS:
+        return jsonify({'message': 'At most %d check_ins per request' % MAX_BULK_PROGRESS}), 400
+    try:
+        entries = [(item['challenge_id'], search.parse_date(item['date'], 'date')) for item in items]
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
 
-    if not progress:
-        return jsonify({'current_day': 0, 'completed': False}), 200
+    try:
+        completed, rejected = check_in_many(request.user['uid'], entries)
+        db.session.commit()
+        if completed:
+            badge_worker.submit(request.user['uid'])
+    except Exception as e:
+        db.session.rollback()
+        print("Error in /progress route:", str(e))
+        return jsonify({'error': 'Something went wrong', 'details': str(e)}), 500
 
     return jsonify({
-        'current_day': progress.current_day,
-        'completed': progress.completed
+        'message': 'Progress updated',
+        'completed': sorted(completed),
+        'rejected': [
+            {'challenge_id': challenge_id, 'date': day, 'message': reason}
+            for challenge_id, day, reason in rejected
+        ]
     }), 200
 
+@api.route('/progress/<int:challenge_id>', methods=['GET'])
+@firebase_token_required
+def get_progress(challenge_id):
+    state = challenge_progress(request.user['uid'], challenge_id, datetime.utcnow().date())
+    if state is None:
+        return jsonify({'message': 'Challenge not found'}), 404
+    return jsonify(state), 200
+
+
+# The caller's check-ins across all their challenges, for a calendar view.
+# Streaks depend on the date, so it is part of the ETag marker.
+@api.route('/progress/calendar', methods=['GET'])
+@firebase_token_required
+@conditional(lambda: versions('progress:' + request.user['uid'], 'challenges') + (datetime.utcnow().date(),))
+def get_progress_calendar():
+    return jsonify({'challenges': calendar(request.user['uid'], datetime.utcnow().date())}), 200
+
 
 # Get challenge by creator ID
-@app.route('/challenges/creator/<string:creator_uid>', methods=['GET'])
+@api.route('/challenges/creator/<string:creator_uid>', methods=['GET'])
 @firebase_token_required
+@conditional(challenge_list_versions)
 def get_challenges_by_creator(creator_uid):
-    challenges = Challenge.query.filter_by(creator=creator_uid).all()
-    output = [{
-        'id': challenge.id,
-        'title': challenge.title,
-        'description': challenge.description,
-        'goal': challenge.goal,
-        'unit': challenge.unit,
-        'difficulty': challenge.difficulty,
-        'start_date': challenge.start_date.isoformat() if challenge.start_date else None,
-        'end_date': challenge.end_date.isoformat() if challenge.end_date else None,
-        'created_at': challenge.created_at.isoformat() if challenge.created_at else None,
-        'creator': challenge.creator,
-        'goal_list': challenge.goal_list or []
-    } for challenge in challenges]
-    return jsonify({'challenges': output}), 200
-
-
-@app.route('/challenges/completed', methods=['GET'])
+    return challenge_list_response(CHALLENGE_FIELDS, Challenge.creator == creator_uid)
+
+
+@api.route('/challenges/completed', methods=['GET'])
 @firebase_token_required
+@conditional(lambda: challenge_list_versions('progress:' + request.user['uid']))
 def get_completed_challenges():
     user_id = request.user['uid']
 
-    # Get all challenge_ids where progress.completed == True
-    completed_progress = UserChallengeProgress.query.filter_by(user_id=user_id, completed=True).all()
-    completed_challenge_ids = [p.challenge_id for p in completed_progress]
-
-    # Fetch the full challenge details for those IDs
-    challenges = Challenge.query.filter(Challenge.id.in_(completed_challenge_ids)).all()
-    
-    output = []
-    for c in challenges:
-        output.append({
-            'id': c.id,
-            'title': c.title,
-            'description': c.description,
-            'goal': c.goal,
-            'unit': c.unit,
-            'difficulty': c.difficulty,
-            'start_date': c.start_date.isoformat() if c.start_date else None,
-            'end_date': c.end_date.isoformat() if c.end_date else None,
-            'created_at': c.created_at.isoformat() if c.created_at else None,
-            'creator': c.creator
-        })
-
-    return jsonify({'challenges': output}), 200
+    # Challenges where progress.completed == True, resolved in the same query
+    return challenge_list_response(CHALLENGE_LIST_FIELDS, Challenge.id.in_(completed_ids(user_id)))
 
 
 # GET account info
-@app.route('/account', methods=['GET'])
+@api.route('/account', methods=['GET'])
 @firebase_token_required
+@conditional(lambda: versions('account:' + request.user['uid']))
 def get_account():
     firebase_uid = request.user['uid']
     user = User.query.filter_by(firebase_uid=firebase_uid).first()
     if not user:
         return jsonify({'message': 'User not found'}), 404
-    return jsonify({
-        'id': user.id,
-        'username': user.username,
-        'email': user.email,
-        'bronze_badges': user.bronze_badges,
-        'silver_badges': user.silver_badges,
-        'gold_badges': user.gold_badges,
-        'firebase_uid': user.firebase_uid
-    }), 200
+    remember_user_id(firebase_uid, user.id)
+    return jsonify(serialize_user(user)), 200
 
 
 # Create account
-@app.route('/account', methods=['POST'])
+@api.route('/account', methods=['POST'])
 @firebase_token_required
 def create_account():
     firebase_uid = request.user['uid']
@@ -313,57 +483,175 @@ def create_account():
         )
         db.session.add(new_user)
         db.session.commit()
+        remember_user_id(firebase_uid, new_user.id)
 
-        return jsonify({
-            'id': new_user.id,
-            'firebase_uid': new_user.firebase_uid,
-            'username': new_user.username,
-            'email': new_user.email,
-            'bronze_badges': new_user.bronze_badges,
-            'silver_badges': new_user.silver_badges,
-            'gold_badges': new_user.gold_badges,
-        }), 201
+        return jsonify(serialize_user(new_user)), 201
 
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': 'Could not create account', 'error': str(e)}), 500
     
 # Get accounts for leaderboard
-@app.route('/leaderboard', methods=['GET'])
+@api.route('/leaderboard', methods=['GET'])
 @firebase_token_required
+@conditional(lambda: versions('users'))
 def get_leaderboard():
-    # Get every user
-    users = User.query.all()
-    payload = []
-    for u in users:
-        payload.append({
-            "id":             u.id,
-            "username":       u.username,
-            "email":          u.email,
-            "bronze_badges":  u.bronze_badges,
-            "silver_badges":  u.silver_badges,
-            "gold_badges":    u.gold_badges,
-            "firebase_uid":   u.firebase_uid,
-        })
+    # Every user, already in rank order via the badge score index
+    rows = db.session.query(*columns(User, USER_FIELDS)).order_by(*leaderboard.ranking_order()).all()
+    serialize = row_serializer(USER_FIELDS)
+    return jsonify([serialize(row) for row in rows]), 200
+
+
+def leaderboard_entry(rank, u):
+    return {
+        "rank":           rank,
+        "points":         u.badge_score,
+        "id":             u.id,
+        "username":       u.username,
+        "bronze_badges":  u.bronze_badges,
+        "silver_badges":  u.silver_badges,
+        "gold_badges":    u.gold_badges,
+        "firebase_uid":   u.firebase_uid,
+    }
+
+
+# Ranked leaderboard page plus the caller's rank and neighbours
+@api.route('/leaderboard/ranked', methods=['GET'])
+@firebase_token_required
+@conditional(lambda: versions('users'))
+def get_ranked_leaderboard():
+    try:
+        limit = parse_limit(request.args.get('limit'), default=20)
+        offset = parse_non_negative(request.args.get('offset'), 'offset')
+        radius = parse_non_negative(request.args.get('radius'), 'radius', default=2, maximum=10)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    payload = {
+        "leaders": [leaderboard_entry(rank, u) for rank, u in leaderboard.top(limit, offset)],
+        "me": None,
+        "neighbours": []
+    }
+
+    me = User.query.filter_by(firebase_uid=request.user['uid']).first()
+    if me:
+        payload["neighbours"] = [leaderboard_entry(rank, u) for rank, u in leaderboard.neighbours(me, radius)]
+        payload["me"] = next(e for e in payload["neighbours"] if e["id"] == me.id)
+
     return jsonify(payload), 200
 
-# Route to fetch for community chat 
-@app.route('/community_chat', methods=['GET'])
+
+# Recompute badge scores for existing rows: flask --app app rebuild-leaderboard
+@api.cli.command('rebuild-leaderboard')
+def rebuild_leaderboard_command():
+    leaderboard.rebuild_scores()
+    print("Leaderboard scores rebuilt")
+
+
+# Stream a full table as NDJSON or CSV, e.g.
+# /admin/export/chat?format=csv&after_id=1200 resumes after the last id received
+# Compressed by the app; the fastest levels keep up with the stream
+@api.route('/admin/export/<name>', methods=['GET'])
+@compression(gzip=1, br=1)
+@admin_token_required
+def export_data(name):
+    fmt = request.args.get('format', 'ndjson')
+    if name not in exports.EXPORTS or fmt not in exports.FORMATS:
+        return jsonify({'message': 'Unknown export or format'}), 404
+    try:
+        after_id = int(request.args['after_id']) if 'after_id' in request.args else None
+    except ValueError:
+        return jsonify({'message': 'after_id must be an integer'}), 400
+
+    headers = {
+        'Content-Disposition': 'attachment; filename=%s.%s' % (name, fmt),
+        'Cache-Control': 'no-store',
+    }
+    return Response(
+        stream_with_context(exports.stream_export(name, fmt, after_id)),
+        mimetype=exports.FORMATS[fmt], headers=headers
+    )
+
+
+# Same export from the shell: flask --app app export chat --format csv --gzip -o chat.csv.gz
+@api.cli.command('export')
+@click.argument('name', type=click.Choice(sorted(exports.EXPORTS)))
+@click.option('--format', 'fmt', type=click.Choice(sorted(exports.FORMATS)), default='ndjson')
+@click.option('--after-id', type=int, help='Resume after the last id already exported.')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+@click.option('-o', '--output', type=click.File('wb'), default='-')
+def export_command(name, fmt, after_id, compress, output):
+    for chunk in exports.stream_export(name, fmt, after_id, compress):
+        output.write(chunk)
+
+
+# Award badges to every user from their completions: flask --app app recompute-badges
+@api.cli.command('recompute-badges')
+def recompute_badges_command():
+    count = badges.recompute_all()
+    print("Badges updated for %d users" % count)
+
+
+# Recompute challenge completion counters from progress rows: flask --app app rebuild-challenge-stats
+@api.cli.command('rebuild-challenge-stats')
+def rebuild_challenge_stats_command():
+    count = rebuild_stats()
+    print("Challenge stats rebuilt for %d challenges" % count)
+
+
+# Route to fetch for community chat
+# ?before_id= pages back through history, ?since_id= returns only newer
+# messages and with ?wait=<seconds> long-polls until one arrives
+# Cached; the tag versions and misses are read from the primary, never a lagging replica
+@api.route('/community_chat', methods=['GET'])
+@read_primary
+@response_cache.cached('chat', unless=lambda: 'wait' in request.args)
 def get_community_chat():
-    messages = CommunityChat.query.order_by(CommunityChat.timestamp.desc()).all()
-    return jsonify([
-        {
-            "id": msg.id,
-            "user": msg.user,
-            "text": msg.text,
-            "image_url": msg.image_url,
-            "timestamp": msg.timestamp.isoformat()
-        } for msg in messages
-    ])
+    try:
+        since_id = request.args.get('since_id', type=int)
+        before_id = request.args.get('before_id', type=int)
+        limit = parse_limit(request.args.get('limit'), default=chat_feed.PAGE_SIZE, maximum=chat_feed.MAX_PAGE_SIZE)
+        wait = min(float(request.args.get('wait', 0)), 30)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    messages = chat_feed.fetch_page(since_id, before_id, limit)
+    # With every wait slot taken, answer right away and let the client poll again
+    if not messages and since_id is not None and wait > 0 and chat_waiters.acquire():
+        try:
+            db.session.remove()
+            chat_broker.wait(since_id, wait)
+        finally:
+            chat_waiters.release()
+        # Re-read even on timeout: posts through other workers do not wake this one
+        messages = chat_feed.fetch_page(since_id, before_id, limit)
+
+    return jsonify([serialize_message(msg) for msg in messages])
+
+
+# Server-Sent Events feed of new community chat messages
+@api.route('/community_chat/stream', methods=['GET'])
+@read_primary
+def stream_community_chat():
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = request.args.get('since_id', 0, type=int)
+    if not chat_waiters.acquire():
+        response = jsonify({"message": "Too many open chat streams, retry shortly or use ?wait="})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
+    response = Response(
+        stream_with_context(chat_feed.stream_events(chat_broker, last_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    response.call_on_close(chat_waiters.release)
+    return response
 
 
 # Route to post a community chat message
-@app.route('/community_chat', methods=['POST'])
+@api.route('/community_chat', methods=['POST'])
 def post_community_chat():
     data = request.get_json()
 
@@ -375,6 +663,7 @@ def post_community_chat():
         )
         db.session.add(new_msg)
         db.session.commit()
+        chat_broker.notify(new_msg.id)
 
         return jsonify({"message": "Chat message posted"}), 201
     except Exception as e:
@@ -382,7 +671,9 @@ def post_community_chat():
 
 
 # Route for home screen
-@app.route('/latest', methods=['GET'])
+@api.route('/latest', methods=['GET'])
+@read_primary
+@response_cache.cached('challenges', 'chat')
 def get_latest_content():
     try:
         # Latest challenges
@@ -393,15 +684,9 @@ def get_latest_content():
             'difficulty': c.difficulty
         } for c in latest_challenges]
 
-        # Latest 5 chat messages
-        latest_messages = CommunityChat.query.order_by(CommunityChat.timestamp.desc()).limit(7).all()
-        message_output = [{
-            'id': m.id,
-            'user': m.user,
-            'text': m.text,
-            'image_url': m.image_url,
-            'timestamp': m.timestamp.isoformat()
-        } for m in latest_messages]
+        # Latest 7 chat messages, from the archive too when the chat is quiet
+        latest_messages = chat_feed.fetch_page(limit=7)
+        message_output = [serialize_message(m) for m in latest_messages]
 
         return jsonify({
             'latest_challenges': challenge_output,
@@ -412,26 +697,21 @@ def get_latest_content():
         return jsonify({'error': 'Failed to fetch latest content', 'details': str(e)}), 500
 
 # Get goals
-@app.route('/goals', methods=['GET'])
+@api.route('/goals', methods=['GET'])
 @firebase_token_required
+@conditional(lambda: versions('goals:%s' % current_user_id()))
 def get_user_goals():
-    firebase_uid = request.user['uid']
-    user = User.query.filter_by(firebase_uid=firebase_uid).first()
-    if not user:
+    user_id = current_user_id()
+    if user_id is None:
         return jsonify({ "message": "User not found" }), 404
 
-    goals = Goal.query.filter_by(user_id=user.id).all()
-    payload = [{
-        "id":           g.id,
-        "title":        g.title,
-        "description":  g.description,
-        "is_completed": g.is_completed
-    } for g in goals]
+    rows = db.session.query(*columns(Goal, GOAL_FIELDS)).filter(Goal.user_id == user_id).all()
+    serialize = row_serializer(GOAL_FIELDS)
 
-    return jsonify({ "goals": payload }), 200
+    return jsonify({ "goals": [serialize(row) for row in rows] }), 200
 
 # Create goal
-@app.route('/goals', methods=['POST'])
+@api.route('/goals', methods=['POST'])
 @firebase_token_required
 def create_user_goal():
     data = request.get_json() or {}
@@ -439,38 +719,29 @@ def create_user_goal():
     if not title:
         return jsonify({ "message": "Title is required" }), 400
 
-    firebase_uid = request.user['uid']
-    user = User.query.filter_by(firebase_uid=firebase_uid).first()
-    if not user:
+    user_id = current_user_id()
+    if user_id is None:
         return jsonify({ "message": "User not found" }), 404
 
     g = Goal(
-      user_id=user.id,
+      user_id=user_id,
       title=title,
       description=data.get('description')
     )
     db.session.add(g)
     db.session.commit()
 
-    return jsonify({
-      "goal": {
-        "id":           g.id,
-        "title":        g.title,
-        "description":  g.description,
-        "is_completed": g.is_completed
-      }
-    }), 201
+    return jsonify({ "goal": serialize_goal(g) }), 201
 
 # Delete goal
-@app.route('/goals/<int:goal_id>', methods=['DELETE'])
+@api.route('/goals/<int:goal_id>', methods=['DELETE'])
 @firebase_token_required
 def delete_user_goal(goal_id):
-    firebase_uid = request.user['uid']
-    user = User.query.filter_by(firebase_uid=firebase_uid).first()
-    if not user:
+    user_id = current_user_id()
+    if user_id is None:
         return jsonify({ "message": "User not found" }), 404
 
-    g = Goal.query.filter_by(id=goal_id, user_id=user.id).first()
+    g = Goal.query.filter_by(id=goal_id, user_id=user_id).first()
     if not g:
         return jsonify({ "message": "Goal not found" }), 404
 
@@ -479,51 +750,35 @@ def delete_user_goal(goal_id):
     return ('', 204)
 
 # Get favorite challenges
-@app.route('/favorites', methods=['GET'])
+@api.route('/favorites', methods=['GET'])
 @firebase_token_required
+@conditional(lambda: versions('favorites:%s' % current_user_id(), 'challenges'))
 def get_user_favorites():
-    firebase_uid = request.user['uid']
-    user = User.query.filter_by(firebase_uid=firebase_uid).first()
-    if not user:
+    user_id = current_user_id()
+    if user_id is None:
         return jsonify({"message": "User not found"}), 404
 
     favorites = (
       db.session
-        .query(Challenge)
+        .query(*columns(Challenge, CHALLENGE_FIELDS))
         .join(FavoriteChallenge, FavoriteChallenge.challenge_id == Challenge.id)
-        .filter(FavoriteChallenge.user_id == user.id)
+        .filter(FavoriteChallenge.user_id == user_id)
         .all()
     )
+    serialize = row_serializer(CHALLENGE_FIELDS)
 
-    return jsonify({
-      "favorites": [
-        {
-          "id":           c.id,
-          "title":        c.title,
-          "description":  c.description,
-          "goal":         c.goal,
-          "unit":         c.unit,
-          "difficulty":   c.difficulty,
-          "start_date":   c.start_date.isoformat() if c.start_date else None,
-          "end_date":     c.end_date.isoformat()   if c.end_date   else None,
-          "created_at":   c.created_at.isoformat(),
-          "creator":      c.creator,
-          "goal_list":    c.goal_list
-        } for c in favorites
-      ]
-    }), 200
+    return jsonify({ "favorites": [serialize(row) for row in favorites] }), 200
 
 # Delete favorite challenge
-@app.route('/favorites/<int:challenge_id>', methods=['DELETE'])
+@api.route('/favorites/<int:challenge_id>', methods=['DELETE'])
 @firebase_token_required
 def delete_user_favorite(challenge_id):
-    firebase_uid = request.user['uid']
-    user = User.query.filter_by(firebase_uid=firebase_uid).first()
-    if not user:
+    user_id = current_user_id()
+    if user_id is None:
         return jsonify({"message": "User not found"}), 404
 
     fav = FavoriteChallenge.query.filter_by(
-        user_id=user.id, challenge_id=challenge_id
+        user_id=user_id, challenge_id=challenge_id
     ).first()
     if not fav:
         return jsonify({"message": "Favorite not found"}), 404
@@ -533,12 +788,11 @@ def delete_user_favorite(challenge_id):
     return jsonify({"message": "Removed from favorites"}), 200
 
 # Add favorite challenge
-@app.route('/favorites/<int:challenge_id>', methods=['POST'])
+@api.route('/favorites/<int:challenge_id>', methods=['POST'])
 @firebase_token_required
 def add_user_favorite(challenge_id):
-    firebase_uid = request.user['uid']
-    user = User.query.filter_by(firebase_uid=firebase_uid).first()
-    if not user:
+    user_id = current_user_id()
+    if user_id is None:
         return jsonify({"message": "User not found"}), 404
 
     # Check if challenge exists
@@ -548,19 +802,120 @@ def add_user_favorite(challenge_id):
 
     # Prevent duplicate favorites
     exists = FavoriteChallenge.query.filter_by(
-        user_id=user.id, challenge_id=challenge_id
+        user_id=user_id, challenge_id=challenge_id
     ).first()
     if exists:
         return jsonify({"message": "Already a favorite"}), 409
 
-    fav = FavoriteChallenge(user_id=user.id, challenge_id=challenge_id)
+    fav = FavoriteChallenge(user_id=user_id, challenge_id=challenge_id)
     db.session.add(fav)
     db.session.commit()
     return jsonify({"message": "Added to favorites"}), 201
 
+# Fail if a hot route's query would scan a whole table: flask --app app check-indexes
+@api.cli.command('check-indexes')
+def check_indexes_command():
+    failed = []
+    for name, plan, uses_index in query_plans.check_indexes():
+        print(("ok      " if uses_index else "NO INDEX") + "  " + name)
+        if not uses_index:
+            failed.append(name)
+            print("          " + plan.replace("\n", "\n          "))
+    if failed:
+        raise SystemExit(1)
+
+
+# Move chat messages past CHAT_RETENTION_DAYS to the archive, e.g. nightly from cron:
+# flask --app app archive-chat
+@api.cli.command('archive-chat')
+@click.option('--days', type=int, help='Override CHAT_RETENTION_DAYS.')
+def archive_chat_command(days):
+    if days is None:
+        days = current_app.config['CHAT_RETENTION_DAYS']
+    moved = chat_archive.archive_messages(days, current_app.config['CHAT_ARCHIVE_BATCH_SIZE'])
+    print("Archived %d chat messages older than %d days" % (moved, days))
+
+
+# Copy the primary SQLite database over the local replica: flask --app app sync-replica
+# Reads lag behind writes until the next sync, like a delayed replica
+@api.cli.command('sync-replica')
+def sync_replica_command():
+    if 'replica' not in db.engines:
+        raise click.ClickException('DATABASE_REPLICA_URL is not set')
+    primary, replica = db.engine, db.engines['replica']
+    if primary.dialect.name != 'sqlite' or replica.dialect.name != 'sqlite':
+        raise click.ClickException('sync-replica only copies SQLite files; use replication for Postgres')
+    with primary.raw_connection() as source, replica.raw_connection() as target:
+        source.driver_connection.backup(target.driver_connection)
+    print("Replica synced from the primary")
+
+
+@event.listens_for(Engine, 'begin')
+def _request_statement_timeout(connection):
+    # Every transaction opened while serving a request, on any bind
+    if not has_request_context() or connection.dialect.name != 'postgresql':
+        return
+    timeout = current_app.config['DB_STATEMENT_TIMEOUT_MS']
+    if timeout:
+        connection.exec_driver_sql('SET LOCAL statement_timeout = %d' % timeout)
+
+
+def create_app(config=None, auth_backend=None):
+    """Build the Flask app.
+
+    ``config`` overrides settings from Config. ``auth_backend`` is any object
+    with ``verify_id_token(token)`` and replaces the verifier AUTH_BACKEND
+    selects, e.g. a LocalTokenSigner in benchmarks.
+    """
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    # X-Last-Write: read-your-writes token for clients without cookies (see db_routing.py)
+    CORS(app, resources={r"/*": {"origins": "*"}}, expose_headers=[LAST_WRITE_HEADER])
+    app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+        if 'SQLALCHEMY_DATABASE_URI' in config and 'SQLALCHEMY_ENGINE_OPTIONS' not in config:
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(config['SQLALCHEMY_DATABASE_URI'])
+        if 'DATABASE_REPLICA_URL' in config and 'SQLALCHEMY_BINDS' not in config:
+            app.config['SQLALCHEMY_BINDS'] = replica_binds(config['DATABASE_REPLICA_URL'])
+
+    # Registered first so its timer starts before any other request hook
+    profiler.init_app(app)
+    db.init_app(app)
+    migrate.init_app(app, db)
+    badge_worker.init_app(app)
+    compressor.init_app(app)
+    replica_router.init_app(app)
+    token_cache.init_app(app)
+    chat_waiters.init_app(app)
+    response_cache.init_app(app)
+    identity.init_app(app)
+
+    app.extensions['auth'] = auth_backend or auth.make_auth_backend(app.config)
+    if app.config['AUTH_PRELOAD'] and hasattr(app.extensions['auth'], 'preload'):
+        app.extensions['auth'].preload()
+
+    app.register_blueprint(api)
+    return app
+
+
+_default_app = None
+
+
+def __getattr__(name):
+    # Keeps `gunicorn app:app` and `flask --app app` working; built on first access
+    global _default_app
+    if name != 'app':
+        raise AttributeError(name)
+    if _default_app is None:
+        _default_app = create_app()
+    return _default_app
+
+
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
-        db.create_all()
+        upgrade()
     app.run(debug=True, host="0.0.0.0")
 
 
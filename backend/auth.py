@@ -0,0 +1,53 @@
+import threading
+
+from token_cache import LocalTokenSigner
+
+
+class FirebaseAuthBackend:
+    """Verifies Firebase ID tokens with firebase_admin.
+
+    firebase_admin, and the google-cloud stack it pulls in, is only imported
+    and initialized on the first verification in each process. Importing the
+    app needs no credentials, and a gunicorn master that preloads the app
+    never holds Firebase HTTP sessions for its forked workers to share.
+    """
+
+    def __init__(self, credentials_path):
+        self.credentials_path = credentials_path
+        self._lock = threading.Lock()
+        self._auth = None
+
+    def preload(self):
+        # Imports only, which is safe before a fork and spares every worker the cost
+        import firebase_admin.auth  # noqa: F401
+
+    def _client(self):
+        if self._auth is None:
+            with self._lock:
+                if self._auth is None:
+                    import firebase_admin
+                    from firebase_admin import auth, credentials
+
+                    if not firebase_admin._apps:
+                        firebase_admin.initialize_app(credentials.Certificate(self.credentials_path))
+                    self._auth = auth
+        return self._auth
+
+    def verify_id_token(self, token):
+        return self._client().verify_id_token(token)
+
+
+def make_auth_backend(config):
+    """The token verifier selected by ``AUTH_BACKEND``.
+
+    'local' accepts tokens signed by LocalTokenSigner with LOCAL_AUTH_SECRET,
+    for development and load tests without Firebase.
+    """
+    name = config['AUTH_BACKEND']
+    if name == 'firebase':
+        return FirebaseAuthBackend(config['FIREBASE_CREDENTIALS'])
+    if name == 'local':
+        if not config['LOCAL_AUTH_SECRET']:
+            raise ValueError('AUTH_BACKEND=local needs LOCAL_AUTH_SECRET')
+        return LocalTokenSigner(secret=config['LOCAL_AUTH_SECRET'])
+    raise ValueError('Unknown AUTH_BACKEND %r' % name)
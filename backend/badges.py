@@ -0,0 +1,146 @@
+import os
+import queue
+import threading
+
+from sqlalchemy import func
+
+from extensions import db
+from models import Challenge, User, UserChallengeProgress
+from etags import bump_versions
+from leaderboard import BADGE_WEIGHTS
+
+# Completing a challenge of each difficulty earns one badge of this kind
+BADGE_FOR_DIFFICULTY = {
+    'beginner': 'bronze_badges',
+    'intermediate': 'silver_badges',
+    'advanced': 'gold_badges',
+}
+
+
+def badge_counts(firebase_uids):
+    """Badge counters earned by each of ``firebase_uids`` from their completions."""
+    rows = db.session.execute(
+        db.select(UserChallengeProgress.user_id, func.lower(Challenge.difficulty), func.count())
+        .join(Challenge, Challenge.id == UserChallengeProgress.challenge_id)
+        .where(UserChallengeProgress.user_id.in_(firebase_uids), UserChallengeProgress.completed.is_(True))
+        .group_by(UserChallengeProgress.user_id, func.lower(Challenge.difficulty))
+    )
+    counts = {uid: dict.fromkeys(BADGE_WEIGHTS, 0) for uid in firebase_uids}
+    for uid, difficulty, count in rows:
+        column = BADGE_FOR_DIFFICULTY.get(difficulty)
+        if column:
+            counts[uid][column] += count
+    return counts
+
+
+def award(firebase_uids):
+    """Bring the badge counters of ``firebase_uids`` in line with their completions.
+
+    Counters are recomputed from the progress rows rather than incremented,
+    so running it twice, or for a user with nothing new, changes nothing.
+    Only users whose counters moved are written, in one bulk UPDATE.
+    Returns the number of users updated. Commits.
+    """
+    firebase_uids = set(firebase_uids)
+    if not firebase_uids:
+        return 0
+
+    counts = badge_counts(firebase_uids)
+    users = db.session.execute(
+        db.select(User.id, User.firebase_uid, *[getattr(User, c) for c in BADGE_WEIGHTS])
+        .where(User.firebase_uid.in_(firebase_uids))
+    )
+
+    updates = []
+    changed = []
+    for user in users:
+        earned = counts[user.firebase_uid]
+        if all((getattr(user, c) or 0) == n for c, n in earned.items()):
+            continue
+        # Bulk updates skip the mapper hook that keeps badge_score current
+        score = sum(n * BADGE_WEIGHTS[c] for c, n in earned.items())
+        updates.append(dict(earned, id=user.id, badge_score=score))
+        changed.append('account:%s' % user.firebase_uid)
+
+    if updates:
+        db.session.execute(db.update(User), updates)
+        bump_versions('users', *changed)
+    db.session.commit()
+    return len(updates)
+
+
+def recompute_all(chunk_size=500):
+    """Award badges to every user, walking the users table in id order.
+
+    Each chunk reads only its users' progress rows, so a backfill never
+    holds the whole table in memory. Returns the number of users updated.
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        chunk = db.session.execute(
+            db.select(User.id, User.firebase_uid).where(User.id > last_id).order_by(User.id).limit(chunk_size)
+        ).all()
+        if not chunk:
+            return updated
+        updated += award(uid for _, uid in chunk)
+        last_id = chunk[-1].id
+
+
+class BadgeWorker:
+    """Awards badges on background threads, off the request path.
+
+    ``submit`` queues a user and returns at once. Each thread takes what is
+    queued, up to ``batch_size`` entries, and awards those users in one pass.
+    Threads are started on first use in each process, so gunicorn workers
+    forked after import get their own.
+    """
+
+    def __init__(self, app=None, workers=1, batch_size=100):
+        self.app = app
+        self.workers = workers
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config['BADGE_WORKERS']
+        self.batch_size = app.config['BADGE_BATCH_SIZE']
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            for _ in range(self.workers):
+                threading.Thread(target=self._run, args=(self._queue,), daemon=True).start()
+            self._pid = os.getpid()
+
+    def submit(self, firebase_uid):
+        self._ensure_started()
+        self._queue.put(firebase_uid)
+
+    def join(self):
+        """Block until everything submitted so far has been awarded."""
+        if self._pid == os.getpid():
+            self._queue.join()
+
+    def _run(self, jobs):
+        while True:
+            batch = [jobs.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(jobs.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self.app.app_context():
+                    award(batch)
+            except Exception:
+                # The next award for these users, or recompute_all, catches up
+                self.app.logger.exception('Badge award failed for %d users', len(set(batch)))
+            finally:
+                for _ in batch:
+                    jobs.task_done()
@@ -0,0 +1,85 @@
+from flask import current_app, g, request
+
+from db_routing import LAST_WRITE_COOKIE, LAST_WRITE_HEADER
+from extensions import db
+
+MAX_BATCH_SIZE = 20
+
+# Sub-request headers the client may set per entry
+FORWARDED_HEADERS = ('If-None-Match',)
+
+
+def run_batch(entries, user):
+    """Dispatch GET sub-requests in-process and collect their responses.
+
+    Every sub-request runs inside the caller's app context, so they share
+    one database session and ``g``; the already verified token is handed
+    down through ``g.verified_user`` instead of being checked again.
+    """
+    g.verified_user = user
+    authorization = request.headers.get('Authorization')
+    # Read-your-writes token, so sub-requests after a write skip a lagging replica
+    last_write = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+
+    results = []
+    for entry in entries:
+        path = entry['path']
+        headers = {'Accept': 'application/json'}
+        if authorization:
+            headers['Authorization'] = authorization
+        if last_write:
+            headers[LAST_WRITE_HEADER] = last_write
+        for name in FORWARDED_HEADERS:
+            value = (entry.get('headers') or {}).get(name)
+            if value:
+                headers[name] = value
+
+        with current_app.test_request_context(path, method='GET', headers=headers, base_url=request.host_url):
+            try:
+                response = current_app.full_dispatch_request()
+            except Exception as e:
+                db.session.rollback()
+                results.append({'path': path, 'status': 500, 'body': {'error': str(e)}})
+                continue
+
+        if response.mimetype == 'text/event-stream':
+            response.close()
+            results.append({'path': path, 'status': 400, 'body': {'message': 'Streaming routes cannot be batched'}})
+            continue
+
+        result = {
+            'path': path,
+            'status': response.status_code,
+            'body': response.get_json(silent=True),
+        }
+        if response.headers.get('ETag'):
+            result['etag'] = response.headers['ETag']
+        results.append(result)
+    return results
+
+
+def validate_entries(data):
+    """Return the list of sub-requests, or raise ValueError."""
+    entries = data.get('requests') if isinstance(data, dict) else None
+    if not isinstance(entries, list) or not entries:
+        raise ValueError('requests must be a non-empty list')
+    if len(entries) > MAX_BATCH_SIZE:
+        raise ValueError('At most %d requests per batch' % MAX_BATCH_SIZE)
+
+    normalized = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'path': entry}
+        if not isinstance(entry, dict) or not isinstance(entry.get('path'), str) or not entry['path'].startswith('/'):
+            raise ValueError('Each request needs a path starting with /')
+        if entry.get('method', 'GET').upper() != 'GET':
+            raise ValueError('Only GET requests can be batched')
+        if entry['path'].split('?')[0].rstrip('/') == '/batch':
+            raise ValueError('Batches cannot be nested')
+        headers = entry.get('headers')
+        if headers is not None and (
+            not isinstance(headers, dict) or not all(isinstance(v, str) for v in headers.values())
+        ):
+            raise ValueError('headers must be an object of string values')
+        normalized.append(entry)
+    return normalized
@@ -0,0 +1,67 @@
+"""Weigh compression CPU time against bytes saved on seeded list payloads.
+
+Seeds a fresh SQLite database like bench_routes, fetches the large list
+routes uncompressed, then times each encoder and level on those bodies.
+Run from the backend directory:
+
+    python -m benchmarks.bench_compression --challenges 20000 --messages 5000
+"""
+import argparse
+import os
+import random
+import tempfile
+import timeit
+
+from benchmarks.bench_routes import seed
+from compression import ENCODERS
+
+ROUTES = ('/challenges', '/challenges?limit=50', '/community_chat?limit=100', '/leaderboard')
+LEVELS = (('gzip', 1), ('gzip', 6), ('gzip', 9), ('br', 1), ('br', 4), ('br', 11))
+
+
+def encode(name, level, body):
+    encoder = ENCODERS[name](level)
+    return encoder.compress(body) + encoder.finish()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--challenges', type=int, default=5000)
+    parser.add_argument('--progress', type=int, default=5000)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    import app as backend
+    from flask_migrate import upgrade
+    from token_cache import LocalTokenSigner
+
+    signer = LocalTokenSigner()
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='bench-compression-'), 'bench.db')
+    app = backend.create_app({'SQLALCHEMY_DATABASE_URI': database_url}, auth_backend=signer)
+    with app.app_context():
+        upgrade()
+        seed(args, random.Random(args.seed))
+
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer ' + signer.sign('uid-0'), 'Accept-Encoding': 'identity'}
+    levels = [(name, level) for name, level in LEVELS if name in ENCODERS]
+    if len(levels) < len(LEVELS):
+        print('brotli is not installed; only gzip is measured')
+
+    print('%-28s %-8s %10s %10s %7s %9s' % ('route', 'encoding', 'bytes', 'saved', 'ratio', 'ms'))
+    for path in ROUTES:
+        body = client.get(path, headers=headers).get_data()
+        print('%-28s %-8s %10d' % (path, 'identity', len(body)))
+        for name, level in levels:
+            size = len(encode(name, level, body))
+            best = min(timeit.repeat(lambda: encode(name, level, body), number=1, repeat=args.repeat))
+            print('%-28s %-8s %10d %10d %6.1fx %9.2f' % (
+                '', '%s-%d' % (name, level), size, len(body) - size, len(body) / size, best * 1000
+            ))
+
+
+if __name__ == '__main__':
+    main()
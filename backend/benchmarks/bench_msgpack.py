@@ -0,0 +1,72 @@
+"""Compare MessagePack and JSON responses for the large list payloads.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_msgpack --rows 10000
+"""
+import argparse
+import timeit
+from datetime import date, datetime, timedelta
+
+from flask import Flask, jsonify
+
+from serializers import (
+    CHALLENGE_LIST_FIELDS, MESSAGE_FIELDS, USER_FIELDS, FastJSONProvider, row_serializer
+)
+
+MSGPACK_HEADERS = {'Accept': 'application/msgpack'}
+
+
+def make_payloads(n):
+    start = datetime(2025, 1, 1)
+    challenges = [(
+        i, 'Challenge %d' % i, 'Do the thing every day', 30, 'minutes', 'beginner',
+        date(2025, 1, 1), date(2025, 2, 1), start + timedelta(minutes=i), 'uid-%d' % (i % 500)
+    ) for i in range(1, n + 1)]
+    messages = [
+        (i, 'user%d' % (i % 300), 'Finished day %d!' % (i % 30), None, start + timedelta(seconds=i))
+        for i in range(1, n + 1)
+    ]
+    users = [
+        (i, 'user%d' % i, 'user%d@example.com' % i, i % 7, i % 5, i % 3, 'uid-%d' % i)
+        for i in range(1, n + 1)
+    ]
+
+    to_challenge = row_serializer(CHALLENGE_LIST_FIELDS)
+    to_message = row_serializer(MESSAGE_FIELDS)
+    to_user = row_serializer(USER_FIELDS)
+    return {
+        'challenges': {'challenges': [to_challenge(r) for r in challenges]},
+        'community_chat': [to_message(r) for r in messages],
+        'leaderboard': [to_user(r) for r in users],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    default_app = Flask('default')
+    fast_app = Flask('fast')
+    fast_app.json = FastJSONProvider(fast_app)
+
+    cases = [
+        ('jsonify (flask default)', default_app, {}),
+        ('jsonify (fast provider)', fast_app, {}),
+        ('msgpack', fast_app, MSGPACK_HEADERS),
+    ]
+
+    print('%d rows per payload, best of %d' % (args.rows, args.repeat))
+    for name, payload in make_payloads(args.rows).items():
+        print('\n' + name)
+        for label, app, headers in cases:
+            with app.test_request_context(headers=headers):
+                body = jsonify(payload).get_data()
+                best = min(timeit.repeat(lambda: jsonify(payload).get_data(), number=1, repeat=args.repeat))
+            print('  %-25s %10d bytes %8.2f ms' % (label, len(body), best * 1000))
+
+
+if __name__ == '__main__':
+    main()
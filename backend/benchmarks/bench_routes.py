@@ -0,0 +1,334 @@
+"""Load-test every route of the API against a seeded local database.
+
+The app is built with a local HS256 signer as its auth backend, so no
+network or Firebase credentials are needed. Start-up time (import and
+create_app) is reported with the results. Run from the backend directory:
+
+    python -m benchmarks.bench_routes --users 1000 --challenges 5000 --threads 8 --duration 20
+
+By default a fresh SQLite file is created; pass --database-url to use a
+scratch Postgres database instead (it is seeded on top of what is there).
+--save writes the results as JSON and --compare fails (exit status 1) when
+a route got slower than a saved run by more than --tolerance, or started
+issuing more queries per request.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+WORDS = (
+    'push', 'pull', 'squat', 'plank', 'run', 'walk', 'swim', 'cycle', 'yoga', 'stretch',
+    'core', 'cardio', 'strength', 'morning', 'daily', 'steps', 'hydrate', 'sleep', 'burpee', 'lunge',
+)
+DIFFICULTIES = ('beginner', 'intermediate', 'advanced')
+ADMIN_TOKEN = 'bench-admin-token'
+METRICS_TOKEN = 'bench-metrics-token'
+
+
+def phrase(rng, n):
+    return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+
+def seed(args, rng):
+    """Fill the database with ``args`` volumes of each kind of row."""
+    from extensions import db
+    from models import Challenge, CommunityChat, FavoriteChallenge, Goal, User, UserChallengeProgress
+    import challenge_stats
+    import leaderboard
+
+    chunk = 1000
+    start = datetime(2025, 1, 1)
+    # Challenges run around today so check-ins are accepted
+    season = (date.today() - timedelta(days=180), date.today() + timedelta(days=180))
+
+    # Users and challenges go through the ORM so mapper hooks fill badge_score and search_vector
+    for first in range(0, args.users, chunk):
+        db.session.add_all([User(
+            username='user%d' % i, email='user%d@example.com' % i, firebase_uid='uid-%d' % i,
+            bronze_badges=rng.randint(0, 20), silver_badges=rng.randint(0, 10), gold_badges=rng.randint(0, 5),
+        ) for i in range(first, min(first + chunk, args.users))])
+        db.session.commit()
+
+    for first in range(0, args.challenges, chunk):
+        db.session.add_all([Challenge(
+            title=phrase(rng, 3).title(), description=phrase(rng, 12), goal=rng.randint(1, 100), unit='reps',
+            difficulty=rng.choice(DIFFICULTIES), start_date=season[0], end_date=season[1],
+            created_at=start + timedelta(minutes=i), creator='uid-%d' % rng.randrange(args.users),
+            goal_list=[phrase(rng, 2) for _ in range(3)],
+        ) for i in range(first, min(first + chunk, args.challenges))])
+        db.session.commit()
+
+    pairs = set()
+    while len(pairs) < min(args.progress, args.users * args.challenges):
+        pairs.add(('uid-%d' % rng.randrange(args.users), rng.randint(1, args.challenges)))
+    rows = [{
+        'user_id': uid, 'challenge_id': cid, 'current_day': 7, 'completed': rng.random() < 0.6,
+        'last_updated': start + timedelta(minutes=rng.randrange(500000)),
+    } for uid, cid in pairs]
+    for first in range(0, len(rows), chunk):
+        db.session.execute(db.insert(UserChallengeProgress), rows[first:first + chunk])
+
+    for first in range(0, args.messages, chunk):
+        db.session.execute(db.insert(CommunityChat), [{
+            'user': 'user%d' % rng.randrange(args.users), 'text': phrase(rng, 8),
+            'timestamp': start + timedelta(seconds=i),
+        } for i in range(first, min(first + chunk, args.messages))])
+
+    favorites = {(rng.randint(1, args.users), rng.randint(1, args.challenges)) for _ in range(args.users * 3)}
+    db.session.execute(db.insert(FavoriteChallenge), [{'user_id': u, 'challenge_id': c} for u, c in favorites])
+    db.session.execute(db.insert(Goal), [{
+        'user_id': rng.randint(1, args.users), 'title': phrase(rng, 3), 'description': phrase(rng, 6),
+    } for _ in range(args.users * 2)])
+    db.session.commit()
+
+    challenge_stats.rebuild_stats()
+    leaderboard.rebuild_scores()
+
+
+def scenarios(args):
+    """(name, weight, request builder) for every route; builders return (method, path, kwargs)."""
+    def challenge(rng):
+        return rng.randint(1, args.challenges)
+
+    def backdated(rng):
+        # Check-ins may be dated up to MAX_BACKDATE_DAYS (2) back
+        return (date.today() - timedelta(days=rng.randrange(3))).isoformat()
+
+    return [
+        ('GET /', 1, lambda rng, uid: ('GET', '/', {})),
+        ('GET /challenges', 2, lambda rng, uid: ('GET', '/challenges', {})),
+        ('GET /challenges?limit', 4, lambda rng, uid: ('GET', '/challenges?limit=50', {})),
+        ('GET /challenges?include', 3, lambda rng, uid: ('GET', '/challenges?limit=50&include=user_state', {})),
+        ('GET /challenges/search', 3, lambda rng, uid: ('GET', '/challenges/search?q=%s' % phrase(rng, 2), {})),
+        ('GET /challenges/<id>', 4, lambda rng, uid: ('GET', '/challenges/%d' % challenge(rng), {})),
+        ('POST /challenges', 1, lambda rng, uid: ('POST', '/challenges', {'json': {
+            'title': phrase(rng, 3), 'description': phrase(rng, 10), 'difficulty': rng.choice(DIFFICULTIES),
+        }})),
+        # Never the creator, so nothing is actually deleted
+        ('DELETE /challenges/<id>', 1, lambda rng, uid: ('DELETE', '/challenges/%d' % challenge(rng), {})),
+        ('GET /challenges/creator/<uid>', 2, lambda rng, uid: ('GET', '/challenges/creator/%s' % uid, {})),
+        ('GET /challenges/completed', 2, lambda rng, uid: ('GET', '/challenges/completed', {})),
+        ('GET /progress/<id>', 3, lambda rng, uid: ('GET', '/progress/%d' % challenge(rng), {})),
+        ('POST /progress/<id>', 2, lambda rng, uid: ('POST', '/progress/%d' % challenge(rng), {'json': {
+            'date': backdated(rng),
+        }})),
+        ('GET /progress/calendar', 2, lambda rng, uid: ('GET', '/progress/calendar', {})),
+        ('POST /progress', 1, lambda rng, uid: ('POST', '/progress', {'json': {
+            'check_ins': [{'challenge_id': challenge(rng), 'date': backdated(rng)} for _ in range(5)],
+        }})),
+        ('GET /account', 3, lambda rng, uid: ('GET', '/account', {})),
+        ('POST /account', 1, lambda rng, uid: ('POST', '/account', {'json': {'username': uid}})),
+        ('GET /leaderboard', 1, lambda rng, uid: ('GET', '/leaderboard', {})),
+        ('GET /leaderboard/ranked', 2, lambda rng, uid: ('GET', '/leaderboard/ranked', {})),
+        ('GET /community_chat', 4, lambda rng, uid: ('GET', '/community_chat', {})),
+        ('GET /community_chat?since_id', 2, lambda rng, uid: (
+            'GET', '/community_chat?since_id=%d' % max(args.messages - 20, 0), {})),
+        ('POST /community_chat', 1, lambda rng, uid: ('POST', '/community_chat', {'json': {
+            'user': uid, 'text': phrase(rng, 8),
+        }})),
+        ('GET /latest', 3, lambda rng, uid: ('GET', '/latest', {})),
+        ('GET /goals', 2, lambda rng, uid: ('GET', '/goals', {})),
+        ('POST /goals', 1, lambda rng, uid: ('POST', '/goals', {'json': {'title': phrase(rng, 3)}})),
+        ('DELETE /goals/<id>', 1, lambda rng, uid: ('DELETE', '/goals/%d' % rng.randint(1, args.users * 2), {})),
+        ('GET /favorites', 2, lambda rng, uid: ('GET', '/favorites', {})),
+        ('POST /favorites/<id>', 1, lambda rng, uid: ('POST', '/favorites/%d' % challenge(rng), {})),
+        ('DELETE /favorites/<id>', 1, lambda rng, uid: ('DELETE', '/favorites/%d' % challenge(rng), {})),
+        ('POST /batch', 2, lambda rng, uid: ('POST', '/batch', {'json': {
+            'requests': ['/latest', '/account', '/goals', '/favorites'],
+        }})),
+        ('GET /metrics/pool', 1, lambda rng, uid: ('GET', '/metrics/pool', {'headers': {'X-Metrics-Token': METRICS_TOKEN}})),
+        ('GET /admin/export/chat', 1, lambda rng, uid: (
+            'GET', '/admin/export/chat?after_id=%d' % max(args.messages - 500, 0),
+            {'headers': {'X-Admin-Token': ADMIN_TOKEN}})),
+        # /community_chat/stream is left out: it holds the connection open by design
+    ]
+
+
+class QueryCounter:
+    """Counts SQL statements issued by the current thread."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def install(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        event.listen(Engine, 'after_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+
+    def take(self):
+        count = getattr(self._local, 'count', 0)
+        self._local.count = 0
+        return count
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def run_load(app, signer, routes, counter, args):
+    """Drive the weighted route mix from ``args.threads`` threads for ``args.duration`` seconds."""
+    names = [name for name, _, _ in routes]
+    weights = [weight for _, weight, _ in routes]
+    builders = {name: build for name, _, build in routes}
+    results = defaultdict(lambda: {'latencies': [], 'queries': 0, 'errors': 0})
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def worker(seed_value):
+        rng = random.Random(seed_value)
+        client = app.test_client()
+        local = defaultdict(lambda: {'latencies': [], 'queries': 0, 'errors': 0})
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            uid = 'uid-%d' % rng.randrange(args.users)
+            method, path, kwargs = builders[name](rng, uid)
+            headers = dict(kwargs.pop('headers', {}), Authorization='Bearer ' + signer.sign(uid))
+
+            counter.take()
+            start = time.perf_counter()
+            response = client.open(path, method=method, headers=headers, **kwargs)
+            response.get_data()
+            elapsed = time.perf_counter() - start
+
+            entry = local[name]
+            entry['latencies'].append(elapsed)
+            entry['queries'] += counter.take()
+            entry['errors'] += response.status_code >= 500
+        with lock:
+            for name, entry in local.items():
+                total = results[name]
+                total['latencies'].extend(entry['latencies'])
+                total['queries'] += entry['queries']
+                total['errors'] += entry['errors']
+
+    threads = [threading.Thread(target=worker, args=(args.seed + i,)) for i in range(args.threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed):
+    report = {}
+    for name, entry in sorted(results.items()):
+        latencies = sorted(entry['latencies'])
+        count = len(latencies)
+        report[name] = {
+            'requests': count,
+            'rps': count / elapsed,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'queries_per_request': entry['queries'] / count,
+            'errors': entry['errors'],
+        }
+    return report
+
+
+def print_report(report, elapsed):
+    total = sum(r['requests'] for r in report.values())
+    print('%d requests in %.1fs, %.0f req/s' % (total, elapsed, total / elapsed))
+    print('%-32s %8s %8s %9s %9s %8s %6s' % ('route', 'requests', 'req/s', 'p50 ms', 'p99 ms', 'queries', 'errors'))
+    for name, r in report.items():
+        print('%-32s %8d %8.1f %9.2f %9.2f %8.1f %6d' % (
+            name, r['requests'], r['rps'], r['p50_ms'], r['p99_ms'], r['queries_per_request'], r['errors']
+        ))
+
+
+def regressions(report, baseline, tolerance):
+    found = []
+    for name, r in report.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if r['p50_ms'] > before['p50_ms'] * (1 + tolerance):
+            found.append('%s: p50 %.2fms -> %.2fms' % (name, before['p50_ms'], r['p50_ms']))
+        if r['queries_per_request'] > before['queries_per_request'] + 0.5:
+            found.append('%s: queries/request %.1f -> %.1f' % (
+                name, before['queries_per_request'], r['queries_per_request']))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='Scratch database to seed (default: a new SQLite file)')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--challenges', type=int, default=5000)
+    parser.add_argument('--progress', type=int, default=20000)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load')
+    parser.add_argument('--routes', help='Only routes whose name contains this text')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Fail on regressions against this saved JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p50 slowdown, as a fraction')
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if not database_url:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='bench-routes-'), 'bench.db')
+
+    started = time.perf_counter()
+    import app as backend
+    imported = time.perf_counter()
+    from token_cache import LocalTokenSigner
+    signer = LocalTokenSigner()
+    app = backend.create_app({
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'ADMIN_TOKEN': ADMIN_TOKEN,
+        'METRICS_TOKEN': METRICS_TOKEN,
+    }, auth_backend=signer)
+    startup = {
+        'import_ms': (imported - started) * 1000,
+        'create_app_ms': (time.perf_counter() - imported) * 1000,
+    }
+    print('Start-up: import %.0fms, create_app %.0fms' % (startup['import_ms'], startup['create_app_ms']))
+
+    from flask_migrate import upgrade
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        upgrade()
+        started = time.perf_counter()
+        seed(args, rng)
+        print('Seeded %s in %.1fs' % (database_url, time.perf_counter() - started))
+
+    routes = scenarios(args)
+    if args.routes:
+        routes = [r for r in routes if args.routes in r[0]]
+
+    counter = QueryCounter()
+    counter.install()
+    results, elapsed = run_load(app, signer, routes, counter, args)
+    report = summarize(results, elapsed)
+    print_report(report, elapsed)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'startup': startup, 'routes': report}, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        found = regressions(report, baseline['routes'], args.tolerance)
+        for line in found:
+            print('REGRESSION ' + line)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Compare the serializers module against the old per-route dict building.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_serializers --rows 10000
+"""
+import argparse
+import json
+import timeit
+from datetime import date, datetime, timedelta
+
+from models import Challenge
+from serializers import CHALLENGE_LIST_FIELDS, FastJSONProvider, object_serializer, row_serializer, orjson
+
+
+def make_rows(n):
+    start = datetime(2025, 1, 1)
+    return [(
+        i, 'Challenge %d' % i, 'Do the thing every day', 30, 'minutes', 'beginner',
+        date(2025, 1, 1), date(2025, 2, 1), start + timedelta(minutes=i), 'uid-%d' % (i % 500)
+    ) for i in range(1, n + 1)]
+
+
+def legacy(challenges):
+    # The dict building previously copied into each challenge list route
+    output = []
+    for c in challenges:
+        output.append({
+            'id': c.id,
+            'title': c.title,
+            'description': c.description,
+            'goal': c.goal,
+            'unit': c.unit,
+            'difficulty': c.difficulty,
+            'start_date': c.start_date.isoformat() if c.start_date else None,
+            'end_date': c.end_date.isoformat() if c.end_date else None,
+            'created_at': c.created_at.isoformat() if c.created_at else None,
+            'creator': c.creator
+        })
+    return json.dumps({'challenges': output})
+
+
+def encode(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, default=FastJSONProvider.default)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    objects = [Challenge(**dict(zip(CHALLENGE_LIST_FIELDS, row))) for row in rows]
+    from_object = object_serializer(CHALLENGE_LIST_FIELDS)
+    from_row = row_serializer(CHALLENGE_LIST_FIELDS)
+
+    cases = [
+        ('legacy dicts + json', lambda: legacy(objects)),
+        ('object_serializer + encoder', lambda: encode({'challenges': [from_object(c) for c in objects]})),
+        ('row_serializer + encoder', lambda: encode({'challenges': [from_row(r) for r in rows]})),
+    ]
+
+    print('%d rows, best of %d, encoder: %s' % (args.rows, args.repeat, 'orjson' if orjson else 'json'))
+    baseline = None
+    for name, fn in cases:
+        best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        baseline = baseline or best
+        print('%-30s %8.2f ms  %5.2fx' % (name, best * 1000, baseline / best))
+
+
+if __name__ == '__main__':
+    main()
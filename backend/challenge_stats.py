@@ -0,0 +1,80 @@
+from sqlalchemy import Float, and_, case, cast, func
+from sqlalchemy.orm import aliased
+
+from extensions import db
+from models import Challenge, ChallengeStats, FavoriteChallenge, UserChallengeProgress
+from etags import bump_versions
+
+# SQL for each stats field; challenges without activity have no stats row
+STAT_COLUMNS = {
+    'participants': func.coalesce(ChallengeStats.participants, 0).label('participants'),
+    'completions': func.coalesce(ChallengeStats.completions, 0).label('completions'),
+    'completion_rate': (
+        cast(ChallengeStats.completions, Float) / func.nullif(ChallengeStats.participants, 0)
+    ).label('completion_rate'),
+    'last_activity': ChallengeStats.last_activity,
+}
+
+# Aliased so filters on the plain models (e.g. a subquery of completed ids)
+# are not correlated with the per-user joins
+_favorite = aliased(FavoriteChallenge)
+_progress = aliased(UserChallengeProgress)
+
+# SQL for each of the caller's own fields; no row means not started or not a favorite
+USER_STATE_COLUMNS = {
+    'is_favorite': _favorite.challenge_id.is_not(None).label('is_favorite'),
+    'is_completed': func.coalesce(_progress.completed, False).label('is_completed'),
+    'current_day': func.coalesce(_progress.current_day, 0).label('current_day'),
+}
+_COMPUTED = {**STAT_COLUMNS, **USER_STATE_COLUMNS}
+
+
+def challenge_query(fields, uid=None, user_id=None):
+    """Query selecting ``fields`` of challenges in order, stats fields included.
+
+    The counters come from a LEFT JOIN on the challenge_stats primary key,
+    so they cost no query of their own. User state fields are LEFT JOINed
+    the same way from the favorites of ``user_id`` (users.id) and the
+    progress of ``uid`` (Firebase UID), both on their unique keys.
+    """
+    query = db.session.query(*[
+        _COMPUTED[f] if f in _COMPUTED else getattr(Challenge, f) for f in fields
+    ]).select_from(Challenge)
+    if any(f in STAT_COLUMNS for f in fields):
+        query = query.outerjoin(ChallengeStats, ChallengeStats.challenge_id == Challenge.id)
+    if any(f in USER_STATE_COLUMNS for f in fields):
+        query = query.outerjoin(_favorite, and_(
+            _favorite.challenge_id == Challenge.id, _favorite.user_id == user_id
+        )).outerjoin(_progress, and_(
+            _progress.challenge_id == Challenge.id, _progress.user_id == uid
+        ))
+    return query
+
+
+def challenge_list_query(fields, *criteria, uid=None, user_id=None):
+    # id and created_at are always selected since the list cursor is built from them
+    selected = list(fields) + [f for f in ('id', 'created_at') if f not in fields]
+    return challenge_query(selected, uid=uid, user_id=user_id).filter(*criteria)
+
+
+def rebuild_stats():
+    """Recompute every counter from the raw progress rows.
+
+    Fixes drift from writes that bypassed check_in. Returns the
+    number of challenges with activity.
+    """
+    table = ChallengeStats.__table__
+    totals = db.select(
+        UserChallengeProgress.challenge_id,
+        func.count(),
+        func.sum(case((UserChallengeProgress.completed.is_(True), 1), else_=0)),
+        func.max(UserChallengeProgress.last_updated),
+    ).join(Challenge, Challenge.id == UserChallengeProgress.challenge_id).group_by(UserChallengeProgress.challenge_id)
+
+    db.session.execute(table.delete())
+    result = db.session.execute(table.insert().from_select(
+        ['challenge_id', 'participants', 'completions', 'last_activity'], totals
+    ))
+    bump_versions('challenge_stats')
+    db.session.commit()
+    return result.rowcount
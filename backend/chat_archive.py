@@ -0,0 +1,59 @@
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, text
+
+from extensions import db
+from models import CommunityChat, CommunityChatArchive
+
+ARCHIVE_COLUMNS = ('id', 'user', 'text', 'image_url', 'timestamp')
+
+
+def _month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def _next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def ensure_partitions(first, last):
+    """Create the monthly archive partitions covering ``first`` to ``last`` on Postgres."""
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return
+    month = _month_start(first)
+    while month <= last:
+        db.session.execute(text(
+            "CREATE TABLE IF NOT EXISTS community_chat_archive_p%s PARTITION OF community_chat_archive "
+            "FOR VALUES FROM ('%s') TO ('%s')" % (month.strftime('%Y%m'), month, _next_month(month))
+        ))
+        month = _next_month(month)
+
+
+def archive_messages(days, batch_size=1000):
+    """Move community chat messages older than ``days`` into the archive.
+
+    Rows move in id order, ``batch_size`` at a time, each batch copied and
+    deleted in one transaction, so an interrupted run loses nothing and can
+    simply be repeated. Returns the number of messages moved.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    oldest = db.session.scalar(db.select(func.min(CommunityChat.timestamp)).where(CommunityChat.timestamp < cutoff))
+    if oldest is None:
+        return 0
+    ensure_partitions(oldest.date(), cutoff.date())
+    db.session.commit()
+
+    moved = 0
+    while True:
+        ids = db.session.scalars(db.select(CommunityChat.id).where(
+            CommunityChat.timestamp < cutoff
+        ).order_by(CommunityChat.id).limit(batch_size)).all()
+        if not ids:
+            return moved
+        db.session.execute(db.insert(CommunityChatArchive).from_select(
+            ARCHIVE_COLUMNS,
+            db.select(*[getattr(CommunityChat, c) for c in ARCHIVE_COLUMNS]).where(CommunityChat.id.in_(ids))
+        ))
+        db.session.execute(db.delete(CommunityChat).where(CommunityChat.id.in_(ids)))
+        db.session.commit()
+        moved += len(ids)
@@ -0,0 +1,113 @@
+import threading
+import time
+
+from flask import current_app
+
+from extensions import db
+from models import CommunityChat, CommunityChatArchive
+from serializers import serialize_message
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+class LocalChatBroker:
+    """In-process notifier for new community chat messages.
+
+    Only the id of the newest message is tracked; readers fetch the messages
+    themselves from the database. A shared broker (e.g. Redis pub/sub) can
+    replace this by providing the same ``notify`` and ``wait`` methods.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._latest_id = 0
+
+    def notify(self, message_id):
+        with self._cond:
+            self._latest_id = max(self._latest_id, message_id)
+            self._cond.notify_all()
+
+    def wait(self, last_id, timeout):
+        # True if a newer message was announced before the timeout
+        with self._cond:
+            return self._cond.wait_for(lambda: self._latest_id > last_id, timeout)
+
+
+class WaiterSlots:
+    """Caps the long-poll and SSE requests waiting at once in this process.
+
+    Each waiting request holds a worker thread for its whole wait, so
+    without a cap a handful of open chat tabs would leave no thread for the
+    rest of the API.
+    """
+
+    def __init__(self, limit=0):
+        self._slots = threading.BoundedSemaphore(limit) if limit > 0 else None
+
+    def init_app(self, app):
+        limit = app.config['CHAT_MAX_WAITERS']
+        self._slots = threading.BoundedSemaphore(limit) if limit > 0 else None
+
+    def acquire(self):
+        return self._slots is not None and self._slots.acquire(blocking=False)
+
+    def release(self):
+        self._slots.release()
+
+
+def page_query(model, since_id, before_id, limit):
+    query = model.query
+    if before_id is not None:
+        query = query.filter(model.id < before_id)
+    if since_id is not None:
+        return query.filter(model.id > since_id).order_by(model.id.asc()).limit(limit)
+    return query.order_by(model.id.desc()).limit(limit)
+
+
+def _page(model, since_id, before_id, limit):
+    return page_query(model, since_id, before_id, limit).all()
+
+
+def fetch_page(since_id=None, before_id=None, limit=PAGE_SIZE):
+    """Return up to ``limit`` messages, newest first.
+
+    With ``since_id`` the oldest messages after that id are taken first so a
+    client paging forward never skips a gap. Archived messages are older than
+    the ones left in community_chat, so pages carry on into the archive, or
+    start from it when paging forward from an archived id.
+    """
+    if since_id is not None:
+        messages = _page(CommunityChatArchive, since_id, before_id, limit)
+        if len(messages) < limit:
+            messages += _page(CommunityChat, since_id, before_id, limit - len(messages))
+        return list(reversed(messages))
+
+    messages = _page(CommunityChat, None, before_id, limit)
+    if len(messages) < limit:
+        before_id = messages[-1].id if messages else before_id
+        messages += _page(CommunityChatArchive, None, before_id, limit - len(messages))
+    return messages
+
+
+def stream_events(broker, last_id, poll_interval=15, max_duration=300):
+    """Yield Server-Sent Events for messages newer than ``last_id``.
+
+    The database is re-checked on every broker wake-up and at least every
+    ``poll_interval`` seconds, so messages posted through another worker are
+    still delivered. The stream ends after ``max_duration`` and the client
+    reconnects with ``Last-Event-ID``.
+    """
+    deadline = time.monotonic() + max_duration
+    yield "retry: 3000\n\n"
+    while time.monotonic() < deadline:
+        messages = [serialize_message(m) for m in fetch_page(since_id=last_id, limit=MAX_PAGE_SIZE)]
+        # Release the connection while idle
+        db.session.remove()
+        if messages:
+            for msg in reversed(messages):
+                yield "id: %d\ndata: %s\n\n" % (msg["id"], current_app.json.dumps(msg))
+            last_id = messages[0]["id"]
+            continue
+        yield ": keep-alive\n\n"
+        broker.wait(last_id, min(poll_interval, max(deadline - time.monotonic(), 0)))
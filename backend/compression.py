@@ -0,0 +1,136 @@
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/msgpack', 'application/x-msgpack',
+    'application/x-ndjson', 'text/csv', 'text/plain', 'text/html',
+}
+
+
+def compression(gzip=None, br=None):
+    """Set the compression levels of one route; 0 turns an encoding off for it.
+
+    Unset levels fall back to COMPRESS_GZIP_LEVEL and COMPRESS_BR_QUALITY.
+    """
+    def decorator(f):
+        f.compression_levels = {'gzip': gzip, 'br': br}
+        return f
+    return decorator
+
+
+class _Gzip:
+    def __init__(self, level):
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._z.compress(data)
+
+    def flush(self):
+        # Everything so far becomes decodable without ending the stream
+        return self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._z.flush()
+
+
+class _Brotli:
+    def __init__(self, quality):
+        self._c = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._c.process(data)
+
+    def flush(self):
+        return self._c.flush()
+
+    def finish(self):
+        return self._c.finish()
+
+
+ENCODERS = {'gzip': _Gzip}
+if brotli is not None:
+    ENCODERS['br'] = _Brotli
+
+
+def _compress_stream(chunks, encoder):
+    # Each chunk is flushed as it goes so streamed rows reach the client promptly
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = encoder.compress(chunk) + encoder.flush()
+            if data:
+                yield data
+        yield encoder.finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+class Compression:
+    """Negotiated gzip/brotli compression of responses.
+
+    JSON, MessagePack, NDJSON and CSV bodies of at least COMPRESS_MIN_SIZE
+    bytes are compressed with the best encoding in ``Accept-Encoding``
+    (brotli when the ``brotli`` package is installed, then gzip). Streamed
+    bodies are compressed chunk by chunk, whatever their size. Server-sent
+    events are left alone so every event is delivered as soon as it is sent.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.config['COMPRESS_MIN_SIZE'] < 0:
+            return
+        app.after_request(self._after_request)
+
+    def _levels(self):
+        config = current_app.config
+        levels = {'gzip': config['COMPRESS_GZIP_LEVEL'], 'br': config['COMPRESS_BR_QUALITY']}
+        view = current_app.view_functions.get(request.endpoint)
+        for name, level in getattr(view, 'compression_levels', {}).items():
+            if level is not None:
+                levels[name] = level
+        return levels
+
+    def _encoding(self, levels):
+        offered = [name for name in ('br', 'gzip') if name in ENCODERS and levels[name] > 0]
+        if not offered:
+            return None
+        return request.accept_encodings.best_match(offered)
+
+    def _after_request(self, response):
+        if (response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or response.status_code < 200 or response.status_code in (204, 304)
+                or response.direct_passthrough
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        # The body depends on Accept-Encoding whether or not this one is compressed
+        response.vary.add('Accept-Encoding')
+        if not response.is_streamed and response.content_length is not None \
+                and response.content_length < current_app.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        levels = self._levels()
+        encoding = self._encoding(levels)
+        if encoding is None:
+            return response
+        encoder = ENCODERS[encoding](levels[encoding])
+
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, encoder)
+            response.headers.pop('Content-Length', None)
+        else:
+            response.set_data(encoder.compress(response.get_data()) + encoder.finish())
+        response.headers['Content-Encoding'] = encoding
+        return response
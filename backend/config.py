@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+
+from sqlalchemy.pool import QueuePool
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, '') else default
+
+
+def env_float(name, default):
+    value = os.getenv(name)
+    return float(value) if value not in (None, '') else default
+
+
+def env_bool(name, default):
+    value = os.getenv(name)
+    if value in (None, ''):
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+
+def engine_options(database_url):
+    """SQLAlchemy engine options, tuned from the environment.
+
+    The pool should have one connection per gunicorn thread (see
+    gunicorn.conf.py); ``workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW)`` must
+    stay below the Postgres ``max_connections`` budget for this service.
+    """
+    options = {
+        'pool_pre_ping': env_bool('DB_POOL_PRE_PING', True),
+        # Recycle before server or proxy idle timeouts drop the connection
+        'pool_recycle': env_int('DB_POOL_RECYCLE', 1800),
+    }
+    database_url = database_url or ''
+    if database_url.startswith('sqlite'):
+        return options
+
+    options.update({
+        'poolclass': TimedQueuePool,
+        'pool_size': env_int('DB_POOL_SIZE', env_int('GUNICORN_THREADS', 4)),
+        'max_overflow': env_int('DB_MAX_OVERFLOW', 2),
+        'pool_timeout': env_int('DB_POOL_TIMEOUT', 10),
+    })
+    return options
+
+
+def replica_binds(replica_url):
+    """SQLALCHEMY_BINDS with the read replica, or none without DATABASE_REPLICA_URL."""
+    if not replica_url:
+        return {}
+    return {'replica': dict(engine_options(replica_url), url=replica_url)}
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {'pool_class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+        })
+    if isinstance(pool, TimedQueuePool):
+        with pool._stats_lock:
+            stats.update({
+                'checkouts': pool.checkouts,
+                'timeouts': pool.timeouts,
+                'wait_seconds_total': round(pool.wait_seconds, 6),
+                'wait_seconds_max': round(pool.max_wait_seconds, 6),
+            })
+    return stats
+
+
+class Config:
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(os.getenv('DATABASE_URL'))
+    # Optional read replica for GET requests (see db_routing.py). Locally, a
+    # copy of the SQLite file works: flask --app app sync-replica refreshes it.
+    DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+    SQLALCHEMY_BINDS = replica_binds(DATABASE_REPLICA_URL)
+    # Postgres statement_timeout for web requests only (SET LOCAL per
+    # transaction), so migrations and CLI jobs are never cut off; 0 disables
+    DB_STATEMENT_TIMEOUT_MS = env_int('DB_STATEMENT_TIMEOUT_MS', 15000)
+    # Lag tolerated on the replica; callers read their own writes from the
+    # primary for this long
+    REPLICA_STALENESS = env_float('REPLICA_STALENESS', 5.0)
+    REPLICA_LAG_CHECK = env_float('REPLICA_LAG_CHECK', 5.0)
+    SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key')
+
+    # Required as X-Metrics-Token on operational endpoints when set
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    # Without a token those endpoints are closed unless this opts in (local dev)
+    METRICS_PUBLIC = env_bool('METRICS_PUBLIC', False)
+    # Required as X-Admin-Token on data exports; exports are disabled when unset
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+    # 'firebase', or 'local' to accept LocalTokenSigner tokens signed with LOCAL_AUTH_SECRET
+    AUTH_BACKEND = os.getenv('AUTH_BACKEND', 'firebase')
+    FIREBASE_CREDENTIALS = os.getenv('FIREBASE_CREDENTIALS', 'firebase_admin_config.json')
+    LOCAL_AUTH_SECRET = os.getenv('LOCAL_AUTH_SECRET')
+    # Import (but do not initialize) firebase_admin in create_app, for gunicorn --preload
+    AUTH_PRELOAD = env_bool('AUTH_PRELOAD', False)
+
+    TOKEN_CACHE_SIZE = env_int('TOKEN_CACHE_SIZE', 10000)
+    TOKEN_CACHE_TTL = env_int('TOKEN_CACHE_TTL', 3600)
+    # Firebase UID -> users.id map (see identity.py)
+    USER_ID_CACHE_SIZE = env_int('USER_ID_CACHE_SIZE', 50000)
+    USER_ID_CACHE_TTL = env_int('USER_ID_CACHE_TTL', 3600)
+    RESPONSE_CACHE_TTL = env_int('RESPONSE_CACHE_TTL', 300)
+
+    # Response compression (see compression.py); COMPRESS_MIN_SIZE=-1 turns it off
+    COMPRESS_MIN_SIZE = env_int('COMPRESS_MIN_SIZE', 1024)
+    COMPRESS_GZIP_LEVEL = env_int('COMPRESS_GZIP_LEVEL', 6)
+    COMPRESS_BR_QUALITY = env_int('COMPRESS_BR_QUALITY', 4)
+
+    # Background threads per process awarding badges after progress updates
+    BADGE_WORKERS = env_int('BADGE_WORKERS', 1)
+    BADGE_BATCH_SIZE = env_int('BADGE_BATCH_SIZE', 100)
+
+    # Community chat messages older than this move to the archive (flask archive-chat)
+    CHAT_RETENTION_DAYS = env_int('CHAT_RETENTION_DAYS', 90)
+    CHAT_ARCHIVE_BATCH_SIZE = env_int('CHAT_ARCHIVE_BATCH_SIZE', 1000)
+    # Long-poll and SSE chat requests waiting at once per process; each holds
+    # a gunicorn thread, so keep this below GUNICORN_THREADS
+    CHAT_MAX_WAITERS = env_int('CHAT_MAX_WAITERS', 2)
+
+    # Request profiling (see profiling.py); off unless PROFILING is set
+    PROFILING = env_bool('PROFILING', False)
+    SLOW_REQUEST_MS = env_int('SLOW_REQUEST_MS', 500)
+    PROFILE_SAMPLE_RATE = env_float('PROFILE_SAMPLE_RATE', 0.01)
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
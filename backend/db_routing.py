@@ -0,0 +1,161 @@
+import logging
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy.session import Session
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = ('GET', 'HEAD')
+REPLICA_BIND = 'replica'
+# Signed marker of a recent write, sent back as a cookie and as a header
+LAST_WRITE_COOKIE = 'last_write'
+LAST_WRITE_HEADER = 'X-Last-Write'
+
+# Seconds the replica is behind; 0 when it has replayed everything it received
+POSTGRES_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def read_primary(f):
+    """Serve every read of a GET route from the primary.
+
+    For views whose result outlives the request, such as response-cached
+    views filled right after an invalidation, or chat reads woken by a new
+    message, where a lagging replica would hand out the old data.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        request.read_primary = True
+        return f(*args, **kwargs)
+    return decorated
+
+
+class RoutingSession(Session):
+    """Session sending the reads of GET requests to the 'replica' bind.
+
+    Writes, reads in any other request, and every read after the request
+    first writes go to the primary. Without a replica bind it behaves as
+    the plain Flask-SQLAlchemy session.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or (clause is not None and not getattr(clause, 'is_select', False)):
+                # Later reads in this request must see the write
+                request.db_wrote = request.read_primary = True
+            elif clause is not None and self._reads_replica():
+                return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_replica(self):
+        if request.method not in READ_METHODS or getattr(request, 'read_primary', False):
+            return False
+        router = current_app.extensions.get('replica_router')
+        return router is not None and router.serves()
+
+
+class ReplicaRouter:
+    """Read/write routing between DATABASE_URL and DATABASE_REPLICA_URL.
+
+    GET requests read from the replica unless the caller wrote within the
+    last REPLICA_STALENESS seconds, so users see their own writes. On
+    Postgres the replica's replay lag is checked every REPLICA_LAG_CHECK
+    seconds, and reads fall back to the primary while it is further behind
+    than REPLICA_STALENESS or unreachable.
+
+    The write time travels with the client, as a token signed with
+    SECRET_KEY in the ``last_write`` cookie and the ``X-Last-Write``
+    response header, so any gunicorn worker can tell a recent writer; clients
+    without cookies send the header back on their next requests.
+    """
+
+    def __init__(self, app=None):
+        self.staleness = 0
+        self.lag_check = 0
+        self.replica_reads = 0
+        self.serializer = None
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self._healthy = True
+        self.lag_seconds = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+            return
+        self.staleness = app.config['REPLICA_STALENESS']
+        self.lag_check = app.config['REPLICA_LAG_CHECK']
+        self.serializer = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='last-write')
+        app.extensions['replica_router'] = self
+        app.after_request(self._mark_writer)
+
+    def _mark_writer(self, response):
+        if self.staleness > 0 and getattr(request, 'db_wrote', False):
+            token = self.serializer.dumps(1)
+            response.set_cookie(LAST_WRITE_COOKIE, token, max_age=int(self.staleness) + 1,
+                                httponly=True, samesite='Lax')
+            response.headers[LAST_WRITE_HEADER] = token
+        return response
+
+    def _wrote_recently(self):
+        token = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+        if not token or self.staleness <= 0:
+            return False
+        try:
+            self.serializer.loads(token, max_age=self.staleness)
+        except BadSignature:
+            # Also expired tokens: the replica has caught up with that write by now
+            return False
+        return True
+
+    def serves(self):
+        if self._wrote_recently():
+            return False
+        if not self._replica_healthy():
+            return False
+        self.replica_reads += 1
+        return True
+
+    def _replica_healthy(self):
+        now = time.monotonic()
+        due = self._checked_at is None or now - self._checked_at >= self.lag_check
+        # One request per process refreshes the lag; the rest use the last result
+        if due and self._lock.acquire(blocking=False):
+            try:
+                self._checked_at = now
+                self._healthy = self._check_lag()
+            finally:
+                self._lock.release()
+        return self._healthy
+
+    def _check_lag(self):
+        engine = current_app.extensions['sqlalchemy'].engines[REPLICA_BIND]
+        if engine.dialect.name != 'postgresql':
+            return True
+        try:
+            with engine.connect() as connection:
+                lag = connection.scalar(POSTGRES_LAG_SQL)
+        except Exception:
+            logger.warning('Replica lag check failed; reading from the primary', exc_info=True)
+            self.lag_seconds = None
+            return False
+        self.lag_seconds = float(lag or 0)
+        if self.lag_seconds > self.staleness:
+            logger.warning('Replica is %.1fs behind; reading from the primary', self.lag_seconds)
+            return False
+        return True
+
+    def stats(self):
+        return {
+            'healthy': self._healthy,
+            'lag_seconds': self.lag_seconds,
+            'replica_reads': self.replica_reads,
+        }
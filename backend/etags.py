@@ -0,0 +1,139 @@
+import hashlib
+from functools import wraps
+
+from flask import Response, current_app, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extensions import UPSERT_INSERTS, db
+from models import (
+    User, Challenge, ChallengeStats, UserChallengeProgress, CommunityChat, Goal, FavoriteChallenge, ResourceVersion
+)
+from serializers import response_format
+
+
+def changed_resources(obj):
+    """Names of the version counters a write to ``obj`` invalidates."""
+    if isinstance(obj, Challenge):
+        return ('challenges',)
+    if isinstance(obj, ChallengeStats):
+        return ('challenge_stats',)
+    if isinstance(obj, User):
+        return ('users', 'account:%s' % obj.firebase_uid)
+    if isinstance(obj, FavoriteChallenge):
+        return ('favorites:%s' % obj.user_id,)
+    if isinstance(obj, Goal):
+        return ('goals:%s' % obj.user_id,)
+    if isinstance(obj, UserChallengeProgress):
+        return ('progress:%s' % obj.user_id,)
+    if isinstance(obj, CommunityChat):
+        return ('chat',)
+    return ()
+
+
+# Counters without a ':' scope (e.g. 'chat', 'challenge_stats') are shared by
+# every writer. Bumping them inside the write transaction would hold their one
+# row lock until commit and queue all chat or progress writes behind it, so
+# they are bumped in a short transaction of their own right after the commit.
+# The cost: between the two commits a reader can still get the old version
+# with the new data, and a crash in between leaves the counter unbumped until
+# the next write; per-user counters ('progress:<uid>') stay transactional.
+SHARED_VERSIONS = 'etags.shared_versions'
+
+
+def bump(connection, names):
+    table = ResourceVersion.__table__
+    names = sorted(names)
+    insert = UPSERT_INSERTS.get(connection.dialect.name)
+    if insert is not None:
+        # One statement, so concurrent first bumps of a counter cannot collide
+        stmt = insert(table).values([{'name': name, 'version': 1} for name in names])
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=['name'], set_={'version': table.c.version + 1}
+        ))
+        return
+    for name in names:
+        result = connection.execute(
+            table.update().where(table.c.name == name).values(version=table.c.version + 1)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(name=name, version=1))
+
+
+def _bump_in_session(session, names):
+    shared = {name for name in names if ':' not in name}
+    session.info.setdefault(SHARED_VERSIONS, set()).update(shared)
+    scoped = set(names) - shared
+    if scoped:
+        bump(session.connection(), scoped)
+
+
+def bump_versions(*names):
+    # For bulk writes that bypass the ORM unit of work
+    _bump_in_session(db.session, names)
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_changed_resources(session, flush_context):
+    # Runs inside the flush, so scoped counters commit atomically with the data
+    names = set()
+    for obj in session.new:
+        names.update(changed_resources(obj))
+    for obj in session.deleted:
+        names.update(changed_resources(obj))
+    for obj in session.dirty:
+        if session.is_modified(obj):
+            names.update(changed_resources(obj))
+    if names:
+        _bump_in_session(session, names)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_shared_resources(session):
+    names = session.info.pop(SHARED_VERSIONS, None)
+    if names:
+        with session.get_bind().begin() as connection:
+            bump(connection, names)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_shared_resources(session):
+    session.info.pop(SHARED_VERSIONS, None)
+
+
+def versions_query(names):
+    return db.select(ResourceVersion.name, ResourceVersion.version).where(ResourceVersion.name.in_(names))
+
+
+def versions(*names):
+    rows = db.session.execute(versions_query(names)).all()
+    found = dict(rows)
+    return tuple(found.get(name, 0) for name in names)
+
+
+def conditional(marker):
+    """Answer ``If-None-Match`` from a cheap version marker.
+
+    ``marker`` returns values that change whenever the view's payload would;
+    when the resulting weak ETag matches, a 304 is sent without running the
+    view at all.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            uid = (getattr(request, 'user', None) or {}).get('uid')
+            key = repr((f.__name__, request.full_path, uid, response_format(), marker()))
+            etag = hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = current_app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Accept')
+            return response
+        return decorated
+    return decorator
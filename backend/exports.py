@@ -0,0 +1,105 @@
+import csv
+import io
+import zlib
+from datetime import date
+
+from flask import current_app
+
+from extensions import db
+from models import Challenge, CommunityChat, CommunityChatArchive, UserChallengeProgress
+from serializers import CHALLENGE_FIELDS, MESSAGE_FIELDS, columns, row_serializer
+
+PROGRESS_FIELDS = (
+    'id', 'user_id', 'challenge_id', 'current_day', 'completed', 'last_updated', 'started_on', 'check_ins'
+)
+
+# Export name -> (model, fields); every export is ordered by its integer id
+EXPORTS = {
+    'challenges': (Challenge, CHALLENGE_FIELDS),
+    'progress': (UserChallengeProgress, PROGRESS_FIELDS),
+    'chat': (CommunityChat, MESSAGE_FIELDS),
+    'chat_archive': (CommunityChatArchive, MESSAGE_FIELDS),
+}
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Rows fetched per round-trip from the server-side cursor
+FETCH_SIZE = 1000
+# Encoded bytes gathered before a chunk is compressed and sent
+CHUNK_SIZE = 64 * 1024
+
+
+def export_rows(name, after_id=None):
+    """Yield rows of export ``name`` as dicts in id order, streamed from the database.
+
+    ``after_id`` resumes an export after the last id a previous run received.
+    """
+    model, fields = EXPORTS[name]
+    query = db.select(*columns(model, fields)).order_by(model.id)
+    if after_id is not None:
+        query = query.where(model.id > after_id)
+
+    serialize = row_serializer(fields)
+    for row in db.session.execute(query.execution_options(yield_per=FETCH_SIZE)):
+        yield serialize(row)
+
+
+def _csv_value(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return current_app.json.dumps(value)
+    return value
+
+
+def encode_lines(name, rows, fmt):
+    """Encode ``rows`` as NDJSON lines or CSV records, one string per row."""
+    if fmt == 'ndjson':
+        dumps = current_app.json.dumps
+        for row in rows:
+            yield dumps(row) + '\n'
+        return
+
+    fields = EXPORTS[name][1]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow([_csv_value(row[f]) for f in fields])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # The header alone when there are no rows
+    if buffer.getvalue():
+        yield buffer.getvalue()
+
+
+def stream_export(name, fmt='ndjson', after_id=None, compress=False):
+    """Yield the export as byte chunks of about CHUNK_SIZE, gzipped if ``compress``.
+
+    Memory stays constant: rows are fetched FETCH_SIZE at a time and each
+    chunk is sent as soon as it fills.
+    """
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+
+    pending = []
+    size = 0
+    for line in encode_lines(name, export_rows(name, after_id), fmt):
+        data = line.encode('utf-8')
+        pending.append(data)
+        size += len(data)
+        if size >= CHUNK_SIZE:
+            chunk = b''.join(pending)
+            pending, size = [], 0
+            if gzip:
+                chunk = gzip.compress(chunk)
+            if chunk:
+                yield chunk
+
+    chunk = b''.join(pending)
+    if gzip:
+        chunk = gzip.compress(chunk) + gzip.flush()
+    if chunk:
+        yield chunk
@@ -1,3 +1,13 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import postgresql, sqlite
 
-db = SQLAlchemy()
+from db_routing import RoutingSession
+
+# GET requests read from the 'replica' bind when one is configured (see db_routing.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE ... RETURNING
+UPSERT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
@@ -0,0 +1,35 @@
+# Gunicorn profile for the Flask backend: gunicorn 'app:create_app()'
+#
+# Each worker runs GUNICORN_THREADS threads and, by default, keeps one pooled
+# database connection per thread (DB_POOL_SIZE, see config.py) plus
+# DB_MAX_OVERFLOW extra for bursts. Size the two so that
+#
+#     GUNICORN_WORKERS * (DB_POOL_SIZE + DB_MAX_OVERFLOW) < Postgres max_connections
+#
+# leaving headroom for migrations and psql sessions. With the defaults below
+# that is 3 * (4 + 2) = 18 connections.
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:' + os.getenv('PORT', '5000'))
+workers = int(os.getenv('GUNICORN_WORKERS', 3))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+# Long-poll and SSE chat requests hold a thread for up to a few minutes; at
+# most CHAT_MAX_WAITERS of them per worker, the rest of the threads stay free
+# for the API. Raise both settings together for chat-heavy deployments.
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then to cap memory growth
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+
+# Build the app once in the master and fork it into the workers. create_app
+# opens no database connections and leaves Firebase uninitialized until a
+# worker verifies its first token, so the fork is safe; with AUTH_PRELOAD
+# the firebase_admin imports are shared instead of repeated per worker.
+preload_app = os.getenv('GUNICORN_PRELOAD', '1').lower() in ('1', 'true', 'yes', 'on')
+if preload_app:
+    os.environ.setdefault('AUTH_PRELOAD', '1')
@@ -0,0 +1,48 @@
+from flask import current_app, g, request
+from sqlalchemy import event
+
+from extensions import db
+from models import User
+from response_cache import LocalCacheBackend
+
+# Firebase UID -> users.id for this process. The mapping never changes for
+# an account, so entries only expire to bound staleness after a deletion.
+user_ids = LocalCacheBackend(maxsize=50000)
+
+
+def init_app(app):
+    user_ids.maxsize = app.config['USER_ID_CACHE_SIZE']
+
+
+def remember_user_id(firebase_uid, user_id):
+    user_ids.set(firebase_uid, user_id, current_app.config['USER_ID_CACHE_TTL'])
+
+
+def forget_user_id(firebase_uid):
+    user_ids.delete(firebase_uid)
+
+
+@event.listens_for(User, 'after_delete')
+def _forget_deleted_user(mapper, connection, user):
+    forget_user_id(user.firebase_uid)
+
+
+def current_user_id():
+    """``users.id`` of the authenticated caller, or None without an account.
+
+    Resolved at most once per request and then served from the process map,
+    so routes keyed on ``users.id`` can skip the ``firebase_uid`` lookup.
+    """
+    if 'user_id' in g:
+        return g.user_id
+
+    firebase_uid = request.user['uid']
+    user_id = user_ids.get(firebase_uid)
+    if user_id is None:
+        # Misses are not cached so a newly created account is seen at once
+        user_id = db.session.scalar(db.select(User.id).where(User.firebase_uid == firebase_uid))
+        if user_id is not None:
+            remember_user_id(firebase_uid, user_id)
+
+    g.user_id = user_id
+    return user_id
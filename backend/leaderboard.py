@@ -0,0 +1,91 @@
+from sqlalchemy import and_, event, or_
+
+from extensions import db
+from models import User
+from etags import bump_versions
+
+# Points per badge, matching the Wall of Fame screen
+BADGE_WEIGHTS = {
+    'bronze_badges': 1,
+    'silver_badges': 2,
+    'gold_badges': 3,
+}
+
+
+def badge_score(user):
+    return sum((getattr(user, column) or 0) * weight for column, weight in BADGE_WEIGHTS.items())
+
+
+@event.listens_for(User, 'before_insert')
+@event.listens_for(User, 'before_update')
+def _refresh_badge_score(mapper, connection, user):
+    # Keep the indexed score column in step with the badge counters
+    user.badge_score = badge_score(user)
+
+
+def ranking_order():
+    return (User.badge_score.desc(), User.username.asc())
+
+
+def _ahead_of(user):
+    return or_(
+        User.badge_score > user.badge_score,
+        and_(User.badge_score == user.badge_score, User.username < user.username)
+    )
+
+
+def _behind(user):
+    return or_(
+        User.badge_score < user.badge_score,
+        and_(User.badge_score == user.badge_score, User.username > user.username)
+    )
+
+
+def top_query(limit, offset=0):
+    return User.query.order_by(*ranking_order()).offset(offset).limit(limit)
+
+
+def rank_query(user):
+    # Index range count of everyone ranked ahead of the user
+    return db.select(db.func.count()).select_from(User).where(_ahead_of(user))
+
+
+def above_query(user, radius):
+    return User.query.filter(_ahead_of(user)).order_by(User.badge_score.asc(), User.username.desc()).limit(radius)
+
+
+def below_query(user, radius):
+    return User.query.filter(_behind(user)).order_by(*ranking_order()).limit(radius)
+
+
+def top(limit, offset=0):
+    """Return ``(rank, user)`` pairs for one page of the leaderboard."""
+    users = top_query(limit, offset).all()
+    return [(offset + i + 1, u) for i, u in enumerate(users)]
+
+
+def rank_of(user):
+    return db.session.scalar(rank_query(user)) + 1
+
+
+def neighbours(user, radius):
+    """Return ``(rank, user)`` pairs for the users around ``user``, inclusive."""
+    rank = rank_of(user)
+    above = above_query(user, radius).all()
+    below = below_query(user, radius).all()
+
+    window = list(reversed(above)) + [user] + below
+    first = rank - len(above)
+    return [(first + i, u) for i, u in enumerate(window)]
+
+
+def rebuild_scores():
+    # Backfill for rows written before badge_score existed
+    User.query.update({
+        User.badge_score: sum(
+            db.func.coalesce(getattr(User, column), 0) * weight
+            for column, weight in BADGE_WEIGHTS.items()
+        )
+    }, synchronize_session=False)
+    bump_versions('users')
+    db.session.commit()
@@ -0,0 +1,32 @@
+"""challenges.created_at not null
+
+Revision ID: 0a9c5e7d2b41
+Revises: f3b8d1e5a260
+Create Date: 2026-10-19 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a9c5e7d2b41'
+down_revision = 'f3b8d1e5a260'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Rows created before the column had a default sort as the oldest
+    op.execute(
+        "UPDATE challenges SET created_at = "
+        "COALESCE((SELECT min(created_at) FROM challenges), CURRENT_TIMESTAMP) "
+        "WHERE created_at IS NULL"
+    )
+    with op.batch_alter_table('challenges', schema=None) as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('challenges', schema=None) as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
@@ -0,0 +1,110 @@
+"""baseline schema
+
+Revision ID: 3f1b2c9d8e01
+Revises: 
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1b2c9d8e01'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created with db.create_all() already have these tables, so
+    # only the missing ones are created and upgrading from there just works
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'users' not in existing:
+        op.create_table('users',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=80), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=True),
+            sa.Column('firebase_uid', sa.String(length=80), nullable=False),
+            sa.Column('bronze_badges', sa.Integer(), nullable=True),
+            sa.Column('silver_badges', sa.Integer(), nullable=True),
+            sa.Column('gold_badges', sa.Integer(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('email'),
+            sa.UniqueConstraint('firebase_uid'),
+            sa.UniqueConstraint('username')
+        )
+    if 'challenges' not in existing:
+        op.create_table('challenges',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=120), nullable=False),
+            sa.Column('description', sa.String(length=500), nullable=True),
+            sa.Column('goal', sa.Integer(), nullable=True),
+            sa.Column('unit', sa.String(length=50), nullable=True),
+            sa.Column('difficulty', sa.String(length=20), nullable=True),
+            sa.Column('start_date', sa.Date(), nullable=True),
+            sa.Column('end_date', sa.Date(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('creator', sa.String(length=120), nullable=False),
+            sa.Column('goal_list', postgresql.ARRAY(sa.Text()).with_variant(sa.JSON(), 'sqlite'), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'community_chat' not in existing:
+        op.create_table('community_chat',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user', sa.String(), nullable=False),
+            sa.Column('text', sa.Text(), nullable=True),
+            sa.Column('image_url', sa.String(), nullable=True),
+            sa.Column('timestamp', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'user_challenge_status' not in existing:
+        op.create_table('user_challenge_status',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.String(), nullable=False),
+            sa.Column('challenge_id', sa.Integer(), nullable=False),
+            sa.Column('completed', sa.Boolean(), nullable=True),
+            sa.Column('timestamp', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'goals' not in existing:
+        op.create_table('goals',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=255), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('is_completed', sa.Boolean(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'user_challenge_progress' not in existing:
+        op.create_table('user_challenge_progress',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.String(length=120), nullable=False),
+            sa.Column('challenge_id', sa.Integer(), nullable=False),
+            sa.Column('current_day', sa.Integer(), nullable=True),
+            sa.Column('completed', sa.Boolean(), nullable=True),
+            sa.Column('last_updated', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['challenge_id'], ['challenges.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'user_favorite_challenges' not in existing:
+        op.create_table('user_favorite_challenges',
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('challenge_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['challenge_id'], ['challenges.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('user_id', 'challenge_id')
+        )
+
+
+def downgrade():
+    op.drop_table('user_favorite_challenges')
+    op.drop_table('user_challenge_progress')
+    op.drop_table('goals')
+    op.drop_table('user_challenge_status')
+    op.drop_table('community_chat')
+    op.drop_table('challenges')
+    op.drop_table('users')
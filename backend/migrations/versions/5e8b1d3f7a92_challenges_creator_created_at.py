@@ -0,0 +1,29 @@
+"""challenges creator index covers the list order
+
+Revision ID: 5e8b1d3f7a92
+Revises: 0a9c5e7d2b41
+Create Date: 2026-10-20 11:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8b1d3f7a92'
+down_revision = '0a9c5e7d2b41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Lets /challenges/creator/<uid> walk one creator's rows in cursor order
+    with op.batch_alter_table('challenges', schema=None) as batch_op:
+        batch_op.drop_index('ix_challenges_creator')
+        batch_op.create_index('ix_challenges_creator', ['creator', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('challenges', schema=None) as batch_op:
+        batch_op.drop_index('ix_challenges_creator')
+        batch_op.create_index('ix_challenges_creator', ['creator'], unique=False)
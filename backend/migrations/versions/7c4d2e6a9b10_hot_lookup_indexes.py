@@ -0,0 +1,65 @@
+"""hot lookup indexes, leaderboard score and resource versions
+
+Revision ID: 7c4d2e6a9b10
+Revises: 3f1b2c9d8e01
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c4d2e6a9b10'
+down_revision = '3f1b2c9d8e01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Leaderboard score, backfilled with the weights from leaderboard.py
+    op.add_column('users', sa.Column('badge_score', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        "UPDATE users SET badge_score = COALESCE(bronze_badges, 0) "
+        "+ 2 * COALESCE(silver_badges, 0) + 3 * COALESCE(gold_badges, 0)"
+    )
+    op.create_index('ix_users_badge_score_username', 'users', [sa.text('badge_score DESC'), 'username'])
+
+    op.create_table('resource_versions',
+        sa.Column('name', sa.String(length=120), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+    # Concurrent taps could insert duplicate progress rows; keep the first
+    op.execute(
+        "DELETE FROM user_challenge_progress WHERE id NOT IN ("
+        "SELECT MIN(id) FROM user_challenge_progress GROUP BY user_id, challenge_id)"
+    )
+    with op.batch_alter_table('user_challenge_progress') as batch_op:
+        batch_op.create_unique_constraint('uq_user_challenge_progress_user_challenge', ['user_id', 'challenge_id'])
+        batch_op.create_index('ix_user_challenge_progress_user_completed', ['user_id', 'completed'])
+
+    op.create_index('ix_challenges_creator', 'challenges', ['creator'])
+    op.create_index('ix_challenges_created_at_id', 'challenges', ['created_at', 'id'])
+    op.create_index('ix_community_chat_timestamp', 'community_chat', ['timestamp'])
+    op.create_index('ix_goals_user_id', 'goals', ['user_id'])
+    op.create_index('ix_user_favorite_challenges_challenge_id', 'user_favorite_challenges', ['challenge_id'])
+
+
+def downgrade():
+    op.drop_index('ix_user_favorite_challenges_challenge_id', table_name='user_favorite_challenges')
+    op.drop_index('ix_goals_user_id', table_name='goals')
+    op.drop_index('ix_community_chat_timestamp', table_name='community_chat')
+    op.drop_index('ix_challenges_created_at_id', table_name='challenges')
+    op.drop_index('ix_challenges_creator', table_name='challenges')
+
+    with op.batch_alter_table('user_challenge_progress') as batch_op:
+        batch_op.drop_index('ix_user_challenge_progress_user_completed')
+        batch_op.drop_constraint('uq_user_challenge_progress_user_challenge', type_='unique')
+
+    op.drop_table('resource_versions')
+
+    op.drop_index('ix_users_badge_score_username', table_name='users')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('badge_score')
@@ -0,0 +1,40 @@
+"""challenge full-text search vector
+
+Revision ID: b82e5f1c0d34
+Revises: 7c4d2e6a9b10
+Create Date: 2026-10-18 09:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'b82e5f1c0d34'
+down_revision = '7c4d2e6a9b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('challenges', sa.Column(
+        'search_vector', postgresql.TSVECTOR().with_variant(sa.Text(), 'sqlite'), nullable=True
+    ))
+
+    # Elsewhere the column stays empty and search runs on an in-process index
+    if op.get_bind().dialect.name == 'postgresql':
+        # Same weighting as search._refresh_search_vector
+        op.execute(
+            "UPDATE challenges SET search_vector = "
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce(array_to_string(goal_list, ' '), '')), 'C')"
+        )
+    op.create_index('ix_challenges_search_vector', 'challenges', ['search_vector'], postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_challenges_search_vector', table_name='challenges')
+    with op.batch_alter_table('challenges') as batch_op:
+        batch_op.drop_column('search_vector')
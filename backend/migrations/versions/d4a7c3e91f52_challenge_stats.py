@@ -0,0 +1,40 @@
+"""per-challenge completion counters
+
+Revision ID: d4a7c3e91f52
+Revises: b82e5f1c0d34
+Create Date: 2026-10-18 11:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a7c3e91f52'
+down_revision = 'b82e5f1c0d34'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'challenge_stats',
+        sa.Column('challenge_id', sa.Integer(), nullable=False),
+        sa.Column('participants', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('completions', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('last_activity', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['challenge_id'], ['challenges.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('challenge_id'),
+    )
+
+    # Same aggregate as challenge_stats.rebuild_stats
+    op.execute(
+        "INSERT INTO challenge_stats (challenge_id, participants, completions, last_activity) "
+        "SELECT p.challenge_id, count(*), sum(CASE WHEN p.completed THEN 1 ELSE 0 END), max(p.last_updated) "
+        "FROM user_challenge_progress p JOIN challenges c ON c.id = p.challenge_id "
+        "GROUP BY p.challenge_id"
+    )
+
+
+def downgrade():
+    op.drop_table('challenge_stats')
@@ -0,0 +1,31 @@
+"""day-by-day check-in bitmap on progress rows
+
+Revision ID: e6f2a9c4b713
+Revises: d4a7c3e91f52
+Create Date: 2026-10-18 14:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6f2a9c4b713'
+down_revision = 'd4a7c3e91f52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows were completed in a single tap, so they keep their
+    # credited current_day and start with no check-in days (NULL bitmap);
+    # bytea on Postgres, so challenges of any length fit
+    with op.batch_alter_table('user_challenge_progress', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('started_on', sa.Date(), nullable=True))
+        batch_op.add_column(sa.Column('check_ins', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('user_challenge_progress', schema=None) as batch_op:
+        batch_op.drop_column('check_ins')
+        batch_op.drop_column('started_on')
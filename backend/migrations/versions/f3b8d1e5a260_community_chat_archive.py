@@ -0,0 +1,47 @@
+"""community chat archive, partitioned by month on postgres
+
+Revision ID: f3b8d1e5a260
+Revises: e6f2a9c4b713
+Create Date: 2026-10-18 16:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8d1e5a260'
+down_revision = 'e6f2a9c4b713'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # Monthly partitions are added by chat_archive.ensure_partitions
+        op.execute(
+            'CREATE TABLE community_chat_archive ('
+            'id INTEGER NOT NULL, '
+            '"user" VARCHAR NOT NULL, '
+            'text TEXT, '
+            'image_url VARCHAR, '
+            '"timestamp" TIMESTAMP WITHOUT TIME ZONE NOT NULL, '
+            'PRIMARY KEY (id, "timestamp")'
+            ') PARTITION BY RANGE ("timestamp")'
+        )
+        return
+
+    op.create_table(
+        'community_chat_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('user', sa.String(), nullable=False),
+        sa.Column('text', sa.Text(), nullable=True),
+        sa.Column('image_url', sa.String(), nullable=True),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id', 'timestamp'),
+    )
+
+
+def downgrade():
+    # Partitions are dropped with their parent on postgres
+    op.drop_table('community_chat_archive')
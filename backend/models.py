@@ -1,6 +1,7 @@
 from datetime import date, datetime
 from extensions import db
-from sqlalchemy.dialects.postgresql import ARRAY 
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
+from sqlalchemy.orm import deferred
 
 
 class User(db.Model):
@@ -17,6 +18,13 @@ class User(db.Model):
     silver_badges = db.Column(db.Integer, default=0)
     gold_badges = db.Column(db.Integer, default=0)
 
+    # Weighted badge total, kept current by leaderboard.py
+    badge_score = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_users_badge_score_username', badge_score.desc(), username),
+    )
+
 
 class Challenge(db.Model):
     __tablename__ = 'challenges'
@@ -29,9 +37,20 @@ class Challenge(db.Model):
     difficulty = db.Column(db.String(20))
     start_date = db.Column(db.Date)
     end_date = db.Column(db.Date)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # NOT NULL since the list cursor is built from it
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     creator = db.Column(db.String(120), nullable=False)
-    goal_list = db.Column(ARRAY(db.Text))
+    # Plain JSON on SQLite so the schema also builds locally
+    goal_list = db.Column(ARRAY(db.Text).with_variant(db.JSON, 'sqlite'))
+
+    # Weighted title/description/goal_list text, maintained by search.py on Postgres
+    search_vector = deferred(db.Column(TSVECTOR().with_variant(db.Text, 'sqlite')))
+
+    __table_args__ = (
+        db.Index('ix_challenges_creator', creator, created_at, id),
+        db.Index('ix_challenges_created_at_id', created_at, id),
+        db.Index('ix_challenges_search_vector', 'search_vector', postgresql_using='gin'),
+    )
 
 
 class UserChallengeProgress(db.Model):
@@ -43,6 +62,25 @@ class UserChallengeProgress(db.Model):
     current_day = db.Column(db.Integer, default=0)
     completed = db.Column(db.Boolean, default=False)
     last_updated = db.Column(db.DateTime, default=datetime.utcnow)
+    # Day-by-day check-ins: a little-endian bitmap, bit i set when the user
+    # checked in on started_on + i days; grows with the challenge (see progress.py)
+    started_on = db.Column(db.Date)
+    check_ins = db.Column(db.LargeBinary)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'challenge_id', name='uq_user_challenge_progress_user_challenge'),
+        db.Index('ix_user_challenge_progress_user_completed', 'user_id', 'completed'),
+    )
+
+
+class ChallengeStats(db.Model):
+    __tablename__ = 'challenge_stats'
+
+    # Counters kept by progress.check_in; `flask rebuild-challenge-stats` recomputes them
+    challenge_id = db.Column(db.Integer, db.ForeignKey('challenges.id', ondelete='CASCADE'), primary_key=True)
+    participants = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    completions = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_activity = db.Column(db.DateTime)
 
 
 class UserChallengeStatus(db.Model):
@@ -60,7 +98,21 @@ class CommunityChat(db.Model):
     user = db.Column(db.String, nullable=False)
     text = db.Column(db.Text, nullable=True)
     image_url = db.Column(db.String, nullable=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class CommunityChatArchive(db.Model):
+    __tablename__ = 'community_chat_archive'
+
+    # Messages moved out of community_chat by chat_archive.archive_messages,
+    # keeping their ids. Partitioned by month on Postgres, which needs the
+    # timestamp in the primary key.
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user = db.Column(db.String, nullable=False)
+    text = db.Column(db.Text, nullable=True)
+    image_url = db.Column(db.String, nullable=True)
+    timestamp = db.Column(db.DateTime, primary_key=True)
+
 
 class FavoriteChallenge(db.Model):
     __tablename__ = 'user_favorite_challenges'
@@ -76,13 +128,22 @@ class FavoriteChallenge(db.Model):
         db.ForeignKey('challenges.id', ondelete='CASCADE'),
         primary_key=True,
         nullable=False,
+        index=True,
     )
 
 class Goal(db.Model):
     __tablename__ = 'goals'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     title = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
     is_completed = db.Column(db.Boolean, default=False)
+
+
+class ResourceVersion(db.Model):
+    __tablename__ = 'resource_versions'
+
+    # e.g. 'challenges', 'users', 'goals:<user id>'
+    name = db.Column(db.String(120), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,88 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def parse_limit(value, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    if value is None or value == '':
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, maximum)
+
+
+def parse_non_negative(value, name, default=0, maximum=None):
+    # Integer query parameters such as ?offset= that may be zero
+    if value is None or value == '':
+        return default
+    message = '%s must be a non-negative integer' % name
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(message)
+    if number < 0:
+        raise ValueError(message)
+    return number if maximum is None else min(number, maximum)
+
+
+def parse_fields(value, allowed):
+    # Comma separated projection, e.g. ?fields=id,title,difficulty
+    if not value:
+        return None
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError('Unknown fields: ' + ', '.join(unknown))
+    return fields
+
+
+def encode_cursor(created_at, row_id):
+    raw = json.dumps([created_at.isoformat(), row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+
+def keyset_query(query, created_col, id_col, cursor, limit):
+    # One row past the page tells whether there is a next one
+    if cursor is not None:
+        created_at, row_id = cursor
+        query = query.filter(or_(
+            created_col < created_at,
+            and_(created_col == created_at, id_col < row_id)
+        ))
+    return query.order_by(created_col.desc(), id_col.desc()).limit(limit + 1)
+
+
+def keyset_page(query, created_col, id_col, cursor, limit):
+    """Return one page of ``query`` ordered newest first on (created_at, id).
+
+    The query must select ``created_col`` and ``id_col`` under their column
+    names. Returns the rows and the cursor for the next page (None at the end).
+    """
+    rows = keyset_query(query, created_col, id_col, cursor, limit).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, created_col.key), getattr(last, id_col.key))
+    return rows, next_cursor
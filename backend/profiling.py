@@ -0,0 +1,216 @@
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Histogram upper bounds in seconds, as in the Prometheus client defaults
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 'other' is whatever the total leaves after the measured phases
+PHASES = ('auth', 'db', 'serialize')
+
+ENVIRON_KEY = 'app.profile'
+
+# Set by Profiler.init_app; while False, phase() and the SQL hooks do nothing
+enabled = False
+
+# cProfile allows one active profiler per process on recent Pythons
+_sampling = threading.Lock()
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        i = bisect_left(BUCKETS, value)
+        if i < len(BUCKETS):
+            self.counts[i] += 1
+
+
+class RequestProfile:
+    __slots__ = ('start', 'phases', 'queries', 'profiler')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = defaultdict(float)
+        self.queries = 0
+        self.profiler = None
+
+
+def _current():
+    if not enabled or not has_request_context():
+        return None
+    return request.environ.get(ENVIRON_KEY)
+
+
+@contextmanager
+def _timed(profile, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.phases[name] += time.perf_counter() - start
+
+
+def phase(name):
+    """Add the time spent in the ``with`` block to phase ``name`` of this request."""
+    profile = _current()
+    if profile is None:
+        return nullcontext()
+    return _timed(profile, name)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._profile_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current()
+    start = getattr(context, '_profile_start', None)
+    if profile is None or start is None:
+        return
+    profile.queries += 1
+    profile.phases['db'] += time.perf_counter() - start
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join('%s="%s"' % (k, _escape(str(v))) for k, v in labels.items())
+
+
+class Profiler:
+    """Opt-in per-route timing, SQL counts and slow-request profiles.
+
+    With ``PROFILING`` off nothing is registered, so requests pay only for
+    the ``phase()`` checks. With it on, each request records its total time
+    and its auth, db, serialize and other phases in per-route histograms,
+    and counts its SQL statements. A ``PROFILE_SAMPLE_RATE`` fraction of
+    requests run under cProfile; the profile is written to ``PROFILE_DIR``
+    when the request takes longer than ``SLOW_REQUEST_MS``.
+
+    Metrics are per process, like the connection pool stats.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.durations = defaultdict(Histogram)
+        self.sql = defaultdict(lambda: [0, 0.0])
+        self.slow = defaultdict(int)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        global enabled
+        if not app.config['PROFILING']:
+            return
+        self.enabled = enabled = True
+        self.logger = app.logger
+        self.slow_seconds = app.config['SLOW_REQUEST_MS'] / 1000.0
+        self.sample_rate = app.config['PROFILE_SAMPLE_RATE']
+        self.profile_dir = app.config['PROFILE_DIR']
+
+        app.before_request(self._start)
+        # Teardown also runs for failed requests and after streamed bodies
+        app.teardown_request(self._finish)
+        # Engine-wide, so only once however many apps are created
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def _start(self):
+        profile = RequestProfile()
+        if self.sample_rate and random.random() < self.sample_rate and _sampling.acquire(blocking=False):
+            profile.profiler = cProfile.Profile()
+            profile.profiler.enable()
+        request.environ[ENVIRON_KEY] = profile
+
+    def _finish(self, exc=None):
+        profile = request.environ.pop(ENVIRON_KEY, None)
+        if profile is None:
+            return
+        total = time.perf_counter() - profile.start
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        key = (request.method, route)
+
+        if profile.profiler is not None:
+            profile.profiler.disable()
+            _sampling.release()
+            if total >= self.slow_seconds:
+                self._dump(profile.profiler, key, total)
+
+        other = max(total - sum(profile.phases[p] for p in PHASES), 0.0)
+        with self._lock:
+            self.durations[key + ('total',)].observe(total)
+            for name in PHASES:
+                self.durations[key + (name,)].observe(profile.phases[name])
+            self.durations[key + ('other',)].observe(other)
+            sql = self.sql[key]
+            sql[0] += profile.queries
+            sql[1] += profile.phases['db']
+            if total >= self.slow_seconds:
+                self.slow[key] += 1
+
+    def _dump(self, profiler, key, total):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        name = re.sub(r'[^A-Za-z0-9]+', '_', '%s %s' % key).strip('_')
+        path = os.path.join(self.profile_dir, '%d-%s-%dms.prof' % (time.time(), name, total * 1000))
+        profiler.dump_stats(path)
+        self.logger.warning('Slow request %s %s took %.0fms, profile written to %s', key[0], key[1], total * 1000, path)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            durations = {k: (list(h.counts), h.sum, h.count) for k, h in self.durations.items()}
+            sql = {k: tuple(v) for k, v in self.sql.items()}
+            slow = dict(self.slow)
+
+        lines = [
+            '# HELP app_request_duration_seconds Request time by route and phase.',
+            '# TYPE app_request_duration_seconds histogram',
+        ]
+        for (method, route, name), (counts, total, count) in sorted(durations.items()):
+            labels = _labels(method=method, route=route, phase=name)
+            cumulative = 0
+            for bound, n in zip(BUCKETS, counts):
+                cumulative += n
+                lines.append('app_request_duration_seconds_bucket{%s,le="%s"} %d' % (labels, bound, cumulative))
+            lines.append('app_request_duration_seconds_bucket{%s,le="+Inf"} %d' % (labels, count))
+            lines.append('app_request_duration_seconds_sum{%s} %.6f' % (labels, total))
+            lines.append('app_request_duration_seconds_count{%s} %d' % (labels, count))
+
+        lines += [
+            '# HELP app_sql_queries_total SQL statements executed by route.',
+            '# TYPE app_sql_queries_total counter',
+        ]
+        lines += ['app_sql_queries_total{%s} %d' % (_labels(method=m, route=r), v[0]) for (m, r), v in sorted(sql.items())]
+        lines += [
+            '# HELP app_sql_duration_seconds_total Time spent in SQL statements by route.',
+            '# TYPE app_sql_duration_seconds_total counter',
+        ]
+        lines += ['app_sql_duration_seconds_total{%s} %.6f' % (_labels(method=m, route=r), v[1]) for (m, r), v in sorted(sql.items())]
+        lines += [
+            '# HELP app_slow_requests_total Requests slower than SLOW_REQUEST_MS by route.',
+            '# TYPE app_slow_requests_total counter',
+        ]
+        lines += ['app_slow_requests_total{%s} %d' % (_labels(method=m, route=r), n) for (m, r), n in sorted(slow.items())]
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,305 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_
+
+from extensions import UPSERT_INSERTS, db
+from models import Challenge, ChallengeStats, UserChallengeProgress
+from etags import bump_versions
+
+# Days to complete a challenge without start and end dates
+DEFAULT_CHALLENGE_DAYS = 7
+# How many days back a check-in may be dated, for offline clients and time zones
+MAX_BACKDATE_DAYS = 2
+
+
+def challenge_length(start_date, end_date):
+    """Check-ins needed to complete a challenge: its span in days, if dated."""
+    if start_date is None or end_date is None or end_date < start_date:
+        return DEFAULT_CHALLENGE_DAYS
+    return (end_date - start_date).days + 1
+
+
+def unpack_days(data):
+    """The stored check_ins bitmap as an int whose bit i is day i."""
+    return int.from_bytes(data or b'', 'little')
+
+
+def pack_days(check_ins):
+    return check_ins.to_bytes((check_ins.bit_length() + 7) // 8, 'little')
+
+
+def days_checked(check_ins):
+    return bin(check_ins).count('1')
+
+
+def current_streak(check_ins, today):
+    """Consecutive days checked in up to bit ``today``.
+
+    A day not checked in yet does not break the streak until it is over.
+    """
+    if today >= 0 and not check_ins >> today & 1:
+        today -= 1
+    if today < 0:
+        return 0
+    gaps = ~check_ins & ((1 << today + 1) - 1)
+    return today + 1 if not gaps else today + 1 - gaps.bit_length()
+
+
+def longest_streak(check_ins):
+    # Each pass shortens every run of set bits by one
+    length = 0
+    while check_ins:
+        check_ins &= check_ins << 1
+        length += 1
+    return length
+
+
+def progress_state(started_on, check_ins, current_day, completed, length, today):
+    """Summary of one progress row as of the date ``today``.
+
+    ``check_ins`` is the stored bitmap; the progress values are None for a
+    challenge not started yet.
+    """
+    check_ins = unpack_days(check_ins)
+    current_day = current_day or 0
+    return {
+        'current_day': current_day,
+        'completed': bool(completed),
+        'length': length,
+        'completion': round(min(current_day / length, 1.0), 4),
+        'started_on': started_on,
+        'streak': current_streak(check_ins, (today - started_on).days) if started_on else 0,
+        'longest_streak': longest_streak(check_ins),
+        'days': [started_on + timedelta(days=i) for i in range(check_ins.bit_length()) if check_ins >> i & 1],
+    }
+
+
+def _row_state(row, today):
+    return progress_state(
+        row.started_on, row.check_ins, row.current_day, row.completed,
+        challenge_length(row.start_date, row.end_date), today,
+    )
+
+
+def calendar_query(user_id):
+    return db.select(
+        UserChallengeProgress.challenge_id, Challenge.title, Challenge.start_date, Challenge.end_date,
+        UserChallengeProgress.started_on, UserChallengeProgress.check_ins,
+        UserChallengeProgress.current_day, UserChallengeProgress.completed,
+    ).join(Challenge, Challenge.id == UserChallengeProgress.challenge_id).where(
+        UserChallengeProgress.user_id == user_id
+    ).order_by(UserChallengeProgress.challenge_id)
+
+
+def calendar(user_id, today):
+    """Every challenge ``user_id`` has progress in, with its check-in days, in one query."""
+    rows = db.session.execute(calendar_query(user_id))
+    return [
+        dict(challenge_id=row.challenge_id, title=row.title, **_row_state(row, today))
+        for row in rows
+    ]
+
+
+def progress_query(user_id, challenge_id):
+    return db.select(
+        Challenge.start_date, Challenge.end_date,
+        UserChallengeProgress.started_on, UserChallengeProgress.check_ins,
+        UserChallengeProgress.current_day, UserChallengeProgress.completed,
+    ).select_from(Challenge).outerjoin(UserChallengeProgress, and_(
+        UserChallengeProgress.challenge_id == Challenge.id, UserChallengeProgress.user_id == user_id
+    )).where(Challenge.id == challenge_id)
+
+
+def challenge_progress(user_id, challenge_id, today):
+    """progress_state of one challenge for ``user_id``; None if it does not exist."""
+    row = db.session.execute(progress_query(user_id, challenge_id)).first()
+    return None if row is None else _row_state(row, today)
+
+
+def completed_ids(user_id):
+    # Challenges ``user_id`` completed, as a subquery for challenge lists
+    return db.select(UserChallengeProgress.challenge_id).filter_by(user_id=user_id, completed=True)
+
+
+def check_in(user_id, challenge, day):
+    """Record that ``user_id`` did ``challenge`` on the date ``day``.
+
+    Raises ValueError, before anything is written, for a day in the future,
+    more than MAX_BACKDATE_DAYS ago or outside the challenge. Returns the
+    progress_state and whether this check-in completed the challenge. The
+    caller commits.
+    """
+    today = datetime.utcnow().date()
+    _check_day(challenge, day, today)
+    states, completed = _record_check_ins(user_id, {challenge.id: (challenge, {day})})
+    state = states[challenge.id]
+    return progress_state(
+        state['started_on'], state['check_ins'], state['current_day'], state['completed'],
+        challenge_length(challenge.start_date, challenge.end_date), max(day, today),
+    ), challenge.id in completed
+
+
+def check_in_many(user_id, entries):
+    """Apply (challenge_id, date) check-ins for ``user_id``, e.g. synced by an offline client.
+
+    The same rules apply as for single check-ins, and all accepted entries
+    are written together. Returns the set of challenge ids newly completed
+    and a list of (challenge_id, date, reason) for the entries that were
+    rejected. The caller commits.
+    """
+    today = datetime.utcnow().date()
+    challenges = {c.id: c for c in Challenge.query.filter(Challenge.id.in_({cid for cid, _ in entries}))}
+    checks = {}
+    rejected = []
+    for challenge_id, day in sorted(set(entries)):
+        challenge = challenges.get(challenge_id)
+        if challenge is None:
+            rejected.append((challenge_id, day, 'Challenge not found'))
+            continue
+        try:
+            _check_day(challenge, day, today)
+        except ValueError as e:
+            rejected.append((challenge_id, day, str(e)))
+            continue
+        checks.setdefault(challenge_id, (challenge, set()))[1].add(day)
+
+    if not checks:
+        return set(), rejected
+    return _record_check_ins(user_id, checks)[1], rejected
+
+
+def _check_day(challenge, day, today):
+    # Clients send their local date, which may be a day ahead of UTC
+    if day > today + timedelta(days=1):
+        raise ValueError('date is in the future')
+    if day < today - timedelta(days=MAX_BACKDATE_DAYS):
+        raise ValueError('date is more than %d days ago' % MAX_BACKDATE_DAYS)
+    if (challenge.start_date and day < challenge.start_date) or (challenge.end_date and day > challenge.end_date):
+        raise ValueError('date is outside the challenge')
+
+
+def _merge_days(row, challenge, days):
+    """Progress values of ``row`` (None for a new row) with ``days`` checked in."""
+    first = min(days)
+    # The first check-in fixes day 0, unless the challenge has a start date;
+    # rows completed in one tap before check-ins existed have no start yet
+    started_on = (row and row.started_on) or challenge.start_date or first
+    check_ins = unpack_days(row and row.check_ins)
+    if first < started_on:
+        # An offline device syncing a day before the first recorded check-in;
+        # only undated challenges get here, and the day is inside the window
+        check_ins <<= (started_on - first).days
+        started_on = first
+    for day in days:
+        check_ins |= 1 << (day - started_on).days
+    # Days credited by the old one-tap completion are kept when they are more
+    current_day = max(days_checked(check_ins), (row and row.current_day) or 0)
+    return {
+        'started_on': started_on,
+        'check_ins': pack_days(check_ins),
+        'current_day': current_day,
+        'completed': bool(row and row.completed) or current_day >= challenge_length(
+            challenge.start_date, challenge.end_date
+        ),
+    }
+
+
+def _lock_progress(user_id, challenge_ids):
+    # Held until commit, so concurrent check-ins apply one after the other;
+    # ordered so concurrent syncs take the row locks in the same order
+    rows = db.session.execute(db.select(
+        UserChallengeProgress.id, UserChallengeProgress.challenge_id,
+        UserChallengeProgress.started_on, UserChallengeProgress.check_ins,
+        UserChallengeProgress.current_day, UserChallengeProgress.completed,
+    ).where(
+        UserChallengeProgress.user_id == user_id, UserChallengeProgress.challenge_id.in_(challenge_ids)
+    ).order_by(UserChallengeProgress.challenge_id).with_for_update())
+    return {row.challenge_id: row for row in rows}
+
+
+def _record_check_ins(user_id, checks):
+    """Set the check-in days of ``checks`` ({challenge_id: (challenge, days)}) for ``user_id``.
+
+    Takes one locked read, one INSERT for new rows and one UPDATE for the
+    rest, however many challenges are involved. New rows are inserted with
+    ON CONFLICT DO NOTHING, whose RETURNING lists only the rows this call
+    created, so of two concurrent first check-ins only one counts as joining;
+    the other is re-read under the lock and updated. Returns the new progress
+    values by challenge id and the set of ids newly completed.
+    """
+    now = datetime.utcnow()
+    insert = UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+    rows = _lock_progress(user_id, sorted(checks))
+
+    states = {}
+    joined = set()
+    missing = sorted(set(checks) - set(rows))
+    if missing:
+        values = [
+            dict(_merge_days(None, *checks[challenge_id]),
+                 user_id=user_id, challenge_id=challenge_id, last_updated=now)
+            for challenge_id in missing
+        ]
+        if insert is None:
+            # Without ON CONFLICT a concurrent first check-in fails on the unique key instead
+            db.session.execute(db.insert(UserChallengeProgress), values)
+            joined = set(missing)
+        else:
+            joined = set(db.session.scalars(insert(UserChallengeProgress).values(values).on_conflict_do_nothing(
+                index_elements=['user_id', 'challenge_id']
+            ).returning(UserChallengeProgress.challenge_id)))
+            lost = set(missing) - joined
+            if lost:
+                rows.update(_lock_progress(user_id, sorted(lost)))
+        states.update((v['challenge_id'], v) for v in values if v['challenge_id'] in joined)
+    completed = {challenge_id for challenge_id in joined if states[challenge_id]['completed']}
+
+    updates = []
+    for challenge_id, row in rows.items():
+        state = _merge_days(row, *checks[challenge_id])
+        if state['completed'] and not row.completed:
+            completed.add(challenge_id)
+        states[challenge_id] = state
+        updates.append(dict(state, id=row.id, last_updated=now))
+    if updates:
+        # One executemany by primary key
+        db.session.execute(db.update(UserChallengeProgress), updates)
+
+    if insert is None:
+        for challenge_id in sorted(checks):
+            _count_activity_fallback(challenge_id, challenge_id in joined, challenge_id in completed, now)
+    else:
+        _count_activity(insert, set(checks), joined, completed, now)
+    # Core statements skip the ORM flush hook that bumps ETag versions
+    bump_versions('progress:%s' % user_id, 'challenge_stats')
+    return states, completed
+
+
+def _count_activity(insert, challenge_ids, joined, completed, now):
+    # Sorted so concurrent requests lock counter rows in the same order
+    stmt = insert(ChallengeStats).values([{
+        'challenge_id': challenge_id,
+        'participants': int(challenge_id in joined),
+        'completions': int(challenge_id in completed),
+        'last_activity': now,
+    } for challenge_id in sorted(challenge_ids)])
+    table = ChallengeStats.__table__
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['challenge_id'],
+        set_={
+            'participants': table.c.participants + stmt.excluded.participants,
+            'completions': table.c.completions + stmt.excluded.completions,
+            'last_activity': stmt.excluded.last_activity,
+        }
+    )
+    db.session.execute(stmt)
+
+
+def _count_activity_fallback(challenge_id, joined, completed, now):
+    stats = db.session.get(ChallengeStats, challenge_id, with_for_update=True)
+    if stats is None:
+        stats = ChallengeStats(challenge_id=challenge_id, participants=0, completions=0)
+        db.session.add(stats)
+    stats.participants += int(joined)
+    stats.completions += int(completed)
+    stats.last_activity = now
@@ -0,0 +1,123 @@
+import re
+from datetime import datetime
+
+from sqlalchemy.orm import Query
+
+import chat_feed
+import leaderboard
+import search
+from challenge_stats import challenge_list_query, challenge_query
+from etags import versions_query
+from extensions import db
+from models import User, Challenge, CommunityChat, CommunityChatArchive, Goal, FavoriteChallenge
+from pagination import keyset_query
+from progress import calendar_query, completed_ids, progress_query
+from serializers import (
+    CHALLENGE_DETAIL_FIELDS, CHALLENGE_FIELDS, CHALLENGE_LIST_FIELDS, GOAL_FIELDS, STATS_FIELDS, USER_FIELDS,
+    USER_STATE_FIELDS, columns
+)
+
+SAMPLE_UID = 'sample-firebase-uid'
+SAMPLE_ID = 1
+SAMPLE_CURSOR = (datetime(2025, 1, 1), SAMPLE_ID)
+
+
+def _page(query, cursor=SAMPLE_CURSOR, limit=50):
+    # A later page of a challenge list, as the routes fetch it with ?cursor=
+    return keyset_query(query, Challenge.created_at, Challenge.id, cursor, limit)
+
+
+def hot_queries():
+    """The statements behind each hot route, with sample parameters.
+
+    Built by the same helpers the routes call, so a route's plan cannot
+    regress unnoticed; the few routes that query inline are copied here.
+    """
+    sample_user = User(username='sample', badge_score=10)
+    list_fields = CHALLENGE_LIST_FIELDS + STATS_FIELDS
+    if db.engine.dialect.name == 'postgresql':
+        search_query = search.fulltext_query('run', challenge_query(list(list_fields) + ['id']), 20, 0)
+    else:
+        search_query = search.ids_query(challenge_query(list(list_fields) + ['id']), [SAMPLE_ID])
+    return {
+        'GET /account': User.query.filter_by(firebase_uid=SAMPLE_UID),
+        'GET /progress/<id>': progress_query(SAMPLE_UID, SAMPLE_ID),
+        'GET /progress/calendar': calendar_query(SAMPLE_UID),
+        'GET /challenges?limit=': _page(challenge_list_query(list_fields), cursor=None),
+        'GET /challenges?cursor=': _page(challenge_list_query(list_fields)),
+        'GET /challenges?include=user_state': _page(challenge_list_query(
+            list_fields + USER_STATE_FIELDS, uid=SAMPLE_UID, user_id=SAMPLE_ID
+        )),
+        'GET /challenges/completed': _page(challenge_list_query(
+            list_fields, Challenge.id.in_(completed_ids(SAMPLE_UID))
+        )),
+        'GET /challenges/creator/<uid>': _page(challenge_list_query(
+            CHALLENGE_FIELDS + STATS_FIELDS, Challenge.creator == SAMPLE_UID
+        )),
+        'GET /challenges/<id>': challenge_query(CHALLENGE_DETAIL_FIELDS).filter(Challenge.id == SAMPLE_ID),
+        'GET /challenges/search': search_query,
+        'GET /latest (challenges)': Challenge.query.order_by(Challenge.created_at.desc()).limit(4),
+        'GET /community_chat': chat_feed.page_query(CommunityChat, None, None, chat_feed.PAGE_SIZE),
+        'GET /community_chat?since_id=': chat_feed.page_query(CommunityChat, SAMPLE_ID, None, chat_feed.PAGE_SIZE),
+        'GET /community_chat (archive)': chat_feed.page_query(
+            CommunityChatArchive, None, SAMPLE_ID, chat_feed.PAGE_SIZE
+        ),
+        'GET /goals': db.session.query(*columns(Goal, GOAL_FIELDS)).filter(Goal.user_id == SAMPLE_ID),
+        'GET /favorites': db.session.query(*columns(Challenge, CHALLENGE_FIELDS)).join(
+            FavoriteChallenge, FavoriteChallenge.challenge_id == Challenge.id
+        ).filter(FavoriteChallenge.user_id == SAMPLE_ID),
+        'GET /leaderboard': db.session.query(*columns(User, USER_FIELDS)).order_by(*leaderboard.ranking_order()),
+        'GET /leaderboard/ranked': leaderboard.top_query(20),
+        'GET /leaderboard/ranked (rank)': leaderboard.rank_query(sample_user),
+        'GET /leaderboard/ranked (above)': leaderboard.above_query(sample_user, 2),
+        'GET /leaderboard/ranked (below)': leaderboard.below_query(sample_user, 2),
+        'ETag markers': versions_query(['challenges', 'users']),
+    }
+
+
+# A full table scan, or a sort that no index could satisfy
+FULL_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan|(^|->\s*)Sort\b', re.MULTILINE),
+    'sqlite': re.compile(r'^\s*(SCAN \w+$|SCAN \w+ (?!USING)|USE TEMP B-TREE FOR ORDER BY)', re.MULTILINE),
+}
+# SQLite reports a LIMITed walk in rowid order as a plain SCAN, which is fine
+# as long as no separate sort step is needed
+LIMITED_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR ORDER BY'),
+}
+# Queries that sort rows already narrowed to one user's, which stays cheap
+USER_BOUNDED_SORTS = {'GET /challenges/completed'}
+SORT_STEP = re.compile(r'^.*(USE TEMP B-TREE FOR ORDER BY|(^|->\s*)Sort\b).*\n?', re.MULTILINE)
+
+
+def explain(statement):
+    """Return the query plan text for ``statement`` on the current engine."""
+    connection = db.session.connection()
+    if isinstance(statement, Query):
+        statement = statement.statement
+    sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True}))
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql)
+        return '\n'.join(row[-1] for row in rows)
+
+    # Small tables make a sequential scan the cheapest plan even when an index
+    # exists, so steer the planner towards any index it could use
+    connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    rows = connection.exec_driver_sql('EXPLAIN ' + sql)
+    return '\n'.join(row[0] for row in rows)
+
+
+def check_indexes():
+    """Yield ``(name, plan, uses_index)`` for every hot query."""
+    dialect = db.engine.dialect.name
+    for name, statement in hot_queries().items():
+        if isinstance(statement, Query):
+            statement = statement.statement
+        plan = explain(statement)
+        checked = SORT_STEP.sub('', plan) if name in USER_BOUNDED_SORTS else plan
+        if statement._limit_clause is not None and dialect in LIMITED_SCAN_PATTERNS:
+            pattern = LIMITED_SCAN_PATTERNS[dialect]
+        else:
+            pattern = FULL_SCAN_PATTERNS.get(dialect)
+        yield name, plan, pattern is None or not pattern.search(checked)
+    db.session.rollback()
@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, request
+
+from serializers import response_format
+
+
+class LocalCacheBackend:
+    """Process-local key/value store with per-entry TTL and LRU eviction.
+
+    A backend shared across gunicorn workers (Redis, memcached) only needs to
+    provide the same ``get``, ``set``, ``delete`` and ``incr`` methods.
+    """
+
+    def __init__(self, maxsize=1024, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = self.clock() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            _, value = self._entries.get(key, (None, 0))
+            self._entries[key] = (None, value + 1)
+            self._entries.move_to_end(key)
+            return value + 1
+
+
+class ResponseCache:
+    """Caches whole view responses, invalidated by tag.
+
+    Every cache key embeds the current version of each of the view's tags,
+    read with ``versions(*tags)``; once a write bumps a version, stale
+    entries are simply never read again and age out of the backend. Passing
+    etags.versions keys entries on the resource_versions counters, which
+    every writer bumps in its own transaction, so a write through one
+    gunicorn worker invalidates the entries of all of them.
+    """
+
+    def __init__(self, versions, backend=None, default_ttl=60):
+        self.versions = versions
+        self.backend = backend or LocalCacheBackend()
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.default_ttl = app.config['RESPONSE_CACHE_TTL']
+
+    def cached(self, *tags, ttl=None, unless=None):
+        def decorator(f):
+            @wraps(f)
+            def decorated(*args, **kwargs):
+                if unless is not None and unless():
+                    return f(*args, **kwargs)
+
+                key = 'view:%s:%s:%s:%r' % (
+                    f.__name__, request.full_path, response_format(), self.versions(*tags)
+                )
+                entry = self.backend.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    body, status, content_type = entry
+                    response = Response(body, status=status, content_type=content_type)
+                    response.vary.add('Accept')
+                    return response
+
+                self.misses += 1
+                response = current_app.make_response(f(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    self.backend.set(
+                        key,
+                        (response.get_data(), response.status_code, response.content_type),
+                        ttl or self.default_ttl
+                    )
+                return response
+            return decorated
+        return decorator
@@ -0,0 +1,159 @@
+import re
+import threading
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import event, func
+
+from extensions import db
+from models import Challenge
+from etags import versions
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Relevance weights for matches in each searchable column
+FIELD_WEIGHTS = (('title', 3), ('description', 2), ('goal_list', 1))
+
+
+def _search_text(challenge):
+    return {
+        'title': challenge.title or '',
+        'description': challenge.description or '',
+        'goal_list': ' '.join(challenge.goal_list or []),
+    }
+
+
+@event.listens_for(Challenge, 'before_insert')
+@event.listens_for(Challenge, 'before_update')
+def _refresh_search_vector(mapper, connection, challenge):
+    # Postgres keeps a weighted tsvector next to the row for the GIN index
+    if connection.dialect.name != 'postgresql':
+        return
+    text = _search_text(challenge)
+    challenge.search_vector = (
+        func.setweight(func.to_tsvector('english', text['title']), 'A')
+        .op('||')(func.setweight(func.to_tsvector('english', text['description']), 'B'))
+        .op('||')(func.setweight(func.to_tsvector('english', text['goal_list']), 'C'))
+    )
+
+
+class InvertedIndex:
+    """In-process full-text index over challenges for non-Postgres databases.
+
+    Maps each token to ``{challenge_id: weight}`` and keeps the filterable
+    columns per challenge. It is rebuilt, streaming rows from the database,
+    whenever the 'challenges' resource version moves.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._postings = {}
+        self._docs = {}
+
+    @staticmethod
+    def tokenize(text):
+        return TOKEN_RE.findall(text.lower())
+
+    def _rebuild(self):
+        postings = defaultdict(dict)
+        docs = {}
+        rows = db.session.execute(db.select(
+            Challenge.id, Challenge.title, Challenge.description, Challenge.goal_list,
+            Challenge.difficulty, Challenge.unit, Challenge.start_date, Challenge.end_date
+        ).execution_options(yield_per=1000))
+        weights = dict(FIELD_WEIGHTS)
+        for challenge in rows:
+            for field, text in _search_text(challenge).items():
+                weight = weights[field]
+                for token in self.tokenize(text):
+                    scores = postings[token]
+                    scores[challenge.id] = scores.get(challenge.id, 0) + weight
+            docs[challenge.id] = (challenge.difficulty, challenge.unit, challenge.start_date, challenge.end_date)
+        self._postings = dict(postings)
+        self._docs = docs
+
+    def refresh(self):
+        version = versions('challenges')
+        with self._lock:
+            if version != self._version:
+                self._rebuild()
+                self._version = version
+
+    def search(self, q, difficulty=None, unit=None, start_after=None, end_before=None):
+        """Return matching challenge ids, best first. Every term must match."""
+        self.refresh()
+        terms = set(self.tokenize(q))
+        if not terms:
+            return []
+
+        scores = None
+        for term in terms:
+            postings = self._postings.get(term, {})
+            if scores is None:
+                scores = dict(postings)
+            else:
+                scores = {cid: s + postings[cid] for cid, s in scores.items() if cid in postings}
+            if not scores:
+                return []
+
+        matches = []
+        for cid, score in scores.items():
+            doc_difficulty, doc_unit, start_date, end_date = self._docs[cid]
+            if difficulty and doc_difficulty != difficulty:
+                continue
+            if unit and doc_unit != unit:
+                continue
+            if start_after and (start_date is None or start_date < start_after):
+                continue
+            if end_before and (end_date is None or end_date > end_before):
+                continue
+            matches.append((-score, -cid))
+        matches.sort()
+        return [-cid for _, cid in matches]
+
+
+inverted_index = InvertedIndex()
+
+
+def parse_date(value, name):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError('%s must be a YYYY-MM-DD date' % name)
+
+
+def fulltext_query(q, query, limit, offset, difficulty=None, unit=None, start_after=None, end_before=None):
+    """``query`` narrowed to one page of matches for ``q``, best first, on Postgres."""
+    query_ts = func.websearch_to_tsquery('english', q)
+    query = query.filter(Challenge.search_vector.op('@@')(query_ts))
+    if difficulty:
+        query = query.filter(Challenge.difficulty == difficulty)
+    if unit:
+        query = query.filter(Challenge.unit == unit)
+    if start_after:
+        query = query.filter(Challenge.start_date >= start_after)
+    if end_before:
+        query = query.filter(Challenge.end_date <= end_before)
+    return query.order_by(
+        func.ts_rank_cd(Challenge.search_vector, query_ts).desc(), Challenge.id.desc()
+    ).offset(offset).limit(limit)
+
+
+def ids_query(query, ids):
+    # The rows of one page of inverted index matches, in any order
+    return query.filter(Challenge.id.in_(ids))
+
+
+def search_challenges(q, query, limit, offset, difficulty=None, unit=None, start_after=None, end_before=None):
+    """Return one page of ``query``'s challenge rows matching ``q``, best match first."""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return fulltext_query(q, query, limit, offset, difficulty, unit, start_after, end_before).all()
+
+    ids = inverted_index.search(q, difficulty, unit, start_after, end_before)[offset:offset + limit]
+    if not ids:
+        return []
+    rows = {row.id: row for row in ids_query(query, ids)}
+    return [rows[cid] for cid in ids if cid in rows]
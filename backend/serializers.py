@@ -0,0 +1,150 @@
+from datetime import date, datetime, timezone
+
+from flask import has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+from profiling import phase
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+
+CHALLENGE_FIELDS = (
+    'id', 'title', 'description', 'goal', 'unit', 'difficulty',
+    'start_date', 'end_date', 'created_at', 'creator', 'goal_list'
+)
+# List routes have always left goal_list out
+CHALLENGE_LIST_FIELDS = CHALLENGE_FIELDS[:-1]
+# Precomputed per-challenge counters, joined in from challenge_stats
+STATS_FIELDS = ('participants', 'completions', 'completion_rate', 'last_activity')
+# The caller's own favorite and progress state, on request (?include=user_state)
+USER_STATE_FIELDS = ('is_favorite', 'is_completed', 'current_day')
+CHALLENGE_DETAIL_FIELDS = CHALLENGE_FIELDS + STATS_FIELDS
+USER_FIELDS = (
+    'id', 'username', 'email', 'bronze_badges', 'silver_badges', 'gold_badges', 'firebase_uid'
+)
+MESSAGE_FIELDS = ('id', 'user', 'text', 'image_url', 'timestamp')
+GOAL_FIELDS = ('id', 'title', 'description', 'is_completed')
+
+
+def _list(value):
+    return value or []
+
+
+def _rate(value):
+    return round(value or 0.0, 4)
+
+
+# Dates are left as objects; the response encoder picks their wire format
+def _hex(value):
+    return (value or b'').hex()
+
+
+CONVERTERS = {
+    'goal_list': _list,
+    'completion_rate': _rate,
+    # Progress check-in bitmap, little-endian: bit i of the bytes is day i
+    'check_ins': _hex,
+}
+
+
+def columns(model, fields):
+    return [getattr(model, f) for f in fields]
+
+
+def row_serializer(fields):
+    """Build a function turning a row tuple into a dict of ``fields``.
+
+    The row must start with ``fields`` in order (as selected with
+    ``columns``); extra trailing values are ignored. Converters are resolved
+    once here rather than per row.
+    """
+    plain = [(i, f) for i, f in enumerate(fields) if f not in CONVERTERS]
+    converted = [(i, f, CONVERTERS[f]) for i, f in enumerate(fields) if f in CONVERTERS]
+
+    def serialize(row):
+        item = {f: row[i] for i, f in plain}
+        for i, f, convert in converted:
+            item[f] = convert(row[i])
+        return item
+    return serialize
+
+
+def object_serializer(fields):
+    # Same as row_serializer, for ORM instances
+    to_dict = row_serializer(fields)
+
+    def serialize(obj):
+        return to_dict([getattr(obj, f) for f in fields])
+    return serialize
+
+
+serialize_challenge = object_serializer(CHALLENGE_FIELDS)
+serialize_user = object_serializer(USER_FIELDS)
+serialize_message = object_serializer(MESSAGE_FIELDS)
+serialize_goal = object_serializer(GOAL_FIELDS)
+
+
+def response_format():
+    """'msgpack' if the client asked for it in ``Accept``, otherwise 'json'."""
+    if msgpack is None or not has_request_context():
+        return 'json'
+    best = request.accept_mimetypes.best_match(('application/json',) + MSGPACK_MIMETYPES)
+    return 'msgpack' if best in MSGPACK_MIMETYPES else 'json'
+
+
+def _json_default(value):
+    # ISO 8601, as orjson writes natively
+    if isinstance(value, date):
+        return value.isoformat()
+    return DefaultJSONProvider.default(value)
+
+
+def _msgpack_default(value):
+    # Dates become Timestamp extension values; naive datetimes are stored as UTC
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return msgpack.Timestamp.from_datetime(value)
+    if isinstance(value, date):
+        return msgpack.Timestamp.from_datetime(datetime(value.year, value.month, value.day, tzinfo=timezone.utc))
+    return DefaultJSONProvider.default(value)
+
+
+def encode_msgpack(obj):
+    return msgpack.packb(obj, default=_msgpack_default)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson when it is installed.
+
+    ``jsonify`` responses are sent as MessagePack instead when the request
+    prefers ``application/msgpack``.
+    """
+
+    default = staticmethod(_json_default)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        with phase('serialize'):
+            if response_format() == 'msgpack':
+                response = self._app.response_class(encode_msgpack(obj), mimetype=MSGPACK_MIMETYPES[0])
+            elif orjson is not None:
+                response = self._app.response_class(orjson.dumps(obj, default=self.default), mimetype=self.mimetype)
+            else:
+                response = self._app.response_class(self.dumps(obj), mimetype=self.mimetype)
+        response.vary.add('Accept')
+        return response
@@ -0,0 +1,125 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+
+
+class TokenCache:
+    """Bounded LRU cache of decoded Firebase ID tokens.
+
+    Entries are keyed by a SHA-256 of the raw token and expire at the token's
+    own ``exp`` claim (capped at ``max_ttl`` seconds), so a cached token is
+    never accepted after Firebase itself would reject it.
+    """
+
+    def __init__(self, maxsize=10000, max_ttl=3600, clock=time.time):
+        self.maxsize = maxsize
+        self.max_ttl = max_ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.maxsize = app.config['TOKEN_CACHE_SIZE']
+        self.max_ttl = app.config['TOKEN_CACHE_TTL']
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        key = self._key(token)
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, decoded = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return decoded
+
+    def put(self, token, decoded):
+        now = self.clock()
+        expires_at = min(decoded.get('exp', now), now + self.max_ttl)
+        if expires_at <= now or self.maxsize <= 0:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, decoded)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def verify(self, token, verifier):
+        # Only call the (expensive) verifier on a cache miss
+        decoded = self.get(token)
+        if decoded is None:
+            decoded = verifier(token)
+            self.put(token, decoded)
+        return decoded
+
+    def invalidate(self, token):
+        with self._lock:
+            self._entries.pop(self._key(token), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+class LocalTokenSigner:
+    """Offline stand-in for Firebase token signing and verification.
+
+    Issues HS256 tokens carrying the same claims the app reads from a
+    Firebase ID token (``uid``, ``email``, ``exp``), and exposes a
+    ``verify_id_token`` with the same contract as ``firebase_admin.auth``.
+    """
+
+    def __init__(self, secret='local-signing-key-for-offline-testing', project_id='local-project', lifetime=3600):
+        self.secret = secret
+        self.project_id = project_id
+        self.lifetime = lifetime
+
+    def sign(self, uid, **claims):
+        now = int(time.time())
+        payload = {
+            'iss': 'https://securetoken.google.com/' + self.project_id,
+            'aud': self.project_id,
+            'sub': uid,
+            'iat': now,
+            'exp': now + self.lifetime,
+        }
+        payload.update(claims)
+        return jwt.encode(payload, self.secret, algorithm='HS256')
+
+    def verify_id_token(self, token):
+        decoded = jwt.decode(
+            token,
+            self.secret,
+            algorithms=['HS256'],
+            audience=self.project_id,
+            issuer='https://securetoken.google.com/' + self.project_id,
+        )
+        decoded['uid'] = decoded['sub']
+        return decoded